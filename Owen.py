@@ -1,7 +1,14 @@
 import struct
+from collections import namedtuple
 # from queue import Queue, Empty, Full
-# from time import monotonic as time
-from threading import Lock
+from time import monotonic as time, perf_counter
+from bisect import bisect_left
+from array import array
+from threading import Lock, Thread
+try:
+    import numpy  # необязательная зависимость для пакетной обработки больших объемов данных
+except ImportError:
+    numpy = None
 
 class OwenError(Exception):
     """Базовый класс для исключений"""
@@ -17,6 +24,22 @@ class OwenProtocolError(OwenError):
     def __str__(self):
        return repr(self.msg)
 
+class OwenTimeoutError(OwenProtocolError):
+    """Исключение вызвано отсутствием ответа прибора за время ожидания"""
+    pass
+
+class OwenCircuitOpenError(OwenProtocolError):
+    """Исключение: адрес исключен из обмена автоматическим выключателем (OwenCircuitBreaker)
+    Attributes:
+        msg       -- текст ошибки
+        address   -- адрес прибора
+        retryTime -- время (monotonic) следующего пробного запроса
+    """
+    def __init__(self, msg, address=None, retryTime=None):
+        self.msg = msg
+        self.address = address
+        self.retryTime = retryTime
+
 class OwenUnpackError(OwenError):
     """ИсклЮчение вызвано ошибкой распаковки данных
     Attributes:        
@@ -29,6 +52,162 @@ class OwenUnpackError(OwenError):
     def __str__(self):
        return repr('{} Data: {}'.format(self.msg,list(self.data)))
 
+def makeCRC16Table(poly=0x8F57, shifts=8):
+    """Таблица из 256 значений: результат shifts сдвигов регистра CRC, в старшем байте которого находится индекс"""
+    table = []
+    for i in range(256):
+        crc = i << 8
+        for j in range(shifts):
+            if (crc & 0x8000):
+                crc = (crc << 1) & 0xFFFF ^ poly
+            else:
+                crc = (crc << 1) & 0xFFFF
+        table.append(crc)
+    return tuple(table)
+
+CRC16_TABLE = makeCRC16Table(0x8F57, 8)  # CRC16 контрольной суммы фрейма (8 бит на байт)
+HASH_TABLE = makeCRC16Table(0x8F57, 7)  # свертка имени параметра (7 бит на байт)
+
+NAME_HASH_CACHE = {}  # общий для процесса кэш: имя параметра -> свертка
+HASH_NAME_INDEX = {}  # обратный индекс: свертка -> имя параметра
+
+def checkCRCTables(count=1000, maxSize=21):
+    """Самопроверка: табличные и побитовые CRC16/HASH должны совпадать на случайных фреймах"""
+    import random
+    owen = OwenProtocol(None, 0)
+    for i in range(count):
+        frame = bytes(random.getrandbits(8) for j in range(random.randint(0, maxSize)))
+        if owen.owenCRC16(frame) != owen.owenCRC16Bitwise(frame):
+            raise OwenError('CRC16 table mismatch on frame {}'.format(list(frame)))
+        if owen.owenHASH(frame) != owen.owenHASHBitwise(frame):
+            raise OwenError('HASH table mismatch on frame {}'.format(list(frame)))
+    return True
+
+# Предварительно скомпилированные форматы (строка формата не разбирается при каждом вызове)
+FLOAT32 = struct.Struct('>f')
+INT16 = struct.Struct('>h')
+UINT16 = struct.Struct('>H')
+INT8 = struct.Struct('b')
+FRAME_HEADER = struct.Struct('>BBH')  # адрес, адрес/признак запроса/размер данных, хэш
+ZERO_BYTES = bytes(64)
+
+def resizeBuffer(buffer, size):  # изменение размера bytearray на месте, без создания нового буфера
+    currentSize = len(buffer)
+    if currentSize > size:
+        del buffer[size:]
+    elif currentSize < size:
+        buffer += ZERO_BYTES[:size - currentSize]
+
+# Кодек тетрад Raw-фрейма: каждый байт передается двумя ASCII символами 'G'..'V' (0x47 + тетрада)
+TETRAD_HI_ENCODE = bytes(0x47 + (b >> 4) for b in range(256))  # байт -> первая тетрада
+TETRAD_LO_ENCODE = bytes(0x47 + (b & 0x0F) for b in range(256))  # байт -> вторая тетрада
+TETRAD_HI_DECODE = bytes(((c - 0x47) << 4) & 0xFF for c in range(256))  # первая тетрада -> старшие 4 бита
+TETRAD_LO_DECODE = bytes((c - 0x47) & 0x0F for c in range(256))  # вторая тетрада -> младшие 4 бита
+TETRAD_SYMBOLS = bytes(range(0x47, 0x57))  # допустимые символы тетрад
+NUMPY_THRESHOLD = 4096  # размер данных (байт), начиная с которого используется numpy (если установлен)
+
+def useNumpyFor(size, useNumpy=None):
+    if useNumpy is None:
+        return numpy is not None and size >= NUMPY_THRESHOLD
+    if useNumpy and numpy is None:
+        raise OwenError('numpy is not installed')
+    return useNumpy
+
+def encodeTetrads(frame, useNumpy=None):
+    """Преобразование двоичных данных в тетрады (без стартового и стопового символов)"""
+    size = len(frame)
+    if useNumpyFor(size, useNumpy):
+        src = numpy.frombuffer(frame, dtype=numpy.uint8)
+        dst = numpy.empty(2 * size, dtype=numpy.uint8)
+        dst[0::2] = (src >> 4) + 0x47
+        dst[1::2] = (src & 0x0F) + 0x47
+        return dst.tobytes()
+    dst = bytearray(2 * size)
+    dst[0::2] = frame.translate(TETRAD_HI_ENCODE)
+    dst[1::2] = frame.translate(TETRAD_LO_ENCODE)
+    return bytes(dst)
+
+def decodeTetrads(tetrads, useNumpy=None):
+    """Склейка тетрад в двоичные данные, непарная последняя тетрада отбрасывается"""
+    size = len(tetrads) // 2
+    if useNumpyFor(size, useNumpy):
+        src = numpy.frombuffer(tetrads, dtype=numpy.uint8, count=2 * size)
+        if ((src < 0x47) | (src > 0x56)).any():
+            raise OwenProtocolError('OwenProtocolError: Illegal tetrad symbol in raw buffer!')
+        return (((src[0::2] - 0x47) << 4) | (src[1::2] - 0x47)).astype(numpy.uint8).tobytes()
+    if tetrads[:2 * size].translate(None, TETRAD_SYMBOLS):
+        raise OwenProtocolError('OwenProtocolError: Illegal tetrad symbol in raw buffer!')
+    hi = tetrads[0:2 * size:2].translate(TETRAD_HI_DECODE)
+    lo = tetrads[1:2 * size:2].translate(TETRAD_LO_DECODE)
+    return (int.from_bytes(hi, 'big') | int.from_bytes(lo, 'big')).to_bytes(size, 'big')
+
+def encodeRawFrame(frame, useNumpy=None):
+    """Raw-фрейм: стартовый символ '#', тетрады, стоповый символ '\\r'"""
+    return b'#' + encodeTetrads(frame, useNumpy) + b'\r'
+
+def decodeRawFrame(rawFrame, useNumpy=None):
+    """Двоичный фрейм из Raw-фрейма с проверкой стартового и стопового символов"""
+    if len(rawFrame) < 2 or rawFrame[0] != 0x23 or rawFrame[-1] != 0x0D:
+        raise OwenProtocolError('OwenProtocolError: Raw buffer does not have start or stop bytes!')
+    return decodeTetrads(rawFrame[1:-1], useNumpy)
+
+def encodeRawFrames(frames, useNumpy=None):
+    """Пакетное кодирование последовательности фреймов в один непрерывный поток"""
+    frames = list(frames)
+    if useNumpyFor(sum(map(len, frames)), useNumpy):
+        tetrads = encodeTetrads(b''.join(frames), True)
+        parts = []
+        pos = 0
+        for frame in frames:
+            end = pos + 2 * len(frame)
+            parts.append(b'#' + tetrads[pos:end] + b'\r')
+            pos = end
+        return b''.join(parts)
+    return b''.join([b'#' + encodeTetrads(frame, False) + b'\r' for frame in frames])
+
+def decodeRawFrames(capture, useNumpy=None):
+    """Пакетное декодирование непрерывного потока Raw-фреймов (например, записи обмена).
+    Данные до символа '#' и незавершенный последний фрейм отбрасываются, возвращает список двоичных фреймов"""
+    bodies = []
+    for part in bytes(capture).split(b'\r')[:-1]:
+        start = part.rfind(b'#')
+        if start >= 0:
+            bodies.append(part[start + 1:start + 1 + (len(part) - start - 1) // 2 * 2])
+    if useNumpyFor(sum(map(len, bodies)) // 2, useNumpy):
+        data = decodeTetrads(b''.join(bodies), True)  # все фреймы за один вызов
+        frames = []
+        pos = 0
+        for body in bodies:
+            end = pos + len(body) // 2
+            frames.append(data[pos:end])
+            pos = end
+        return frames
+    return [decodeTetrads(body, False) for body in bodies]
+
+def checkTetradCodec(count=1000, maxSize=21):
+    """Самопроверка: пакетный кодек тетрад должен совпадать с побайтовым преобразованием"""
+    import random
+    owen = OwenProtocol(None, 0)
+    frames = []
+    for i in range(count):
+        frame = bytes(random.getrandbits(8) for j in range(random.randint(1, maxSize)))
+        frames.append(frame)
+        owen.frame = bytearray(frame)
+        owen.packRawFramePerByte()
+        rawFrame = bytes(owen.rawFrame)
+        if encodeRawFrame(frame, False) != rawFrame:
+            raise OwenError('Tetrad encoding mismatch on frame {}'.format(list(frame)))
+        owen.unpackRawFramePerByte(rawFrame)
+        if decodeRawFrame(rawFrame, False) != bytes(owen.frame):
+            raise OwenError('Tetrad decoding mismatch on frame {}'.format(list(frame)))
+    capture = encodeRawFrames(frames, False)
+    if decodeRawFrames(capture, False) != frames:
+        raise OwenError('Tetrad capture decoding mismatch')
+    if numpy is not None:
+        if encodeRawFrames(frames, True) != capture or decodeRawFrames(capture, True) != frames:
+            raise OwenError('Tetrad numpy codec mismatch')
+    return True
+
 class OwenProtocol:  # Класс, реализующий протокол ОВЕН напрямую в python
     # maxFrameSize = 21 # максимальная длина пакета согласно протоколу ОВЕН
     def __init__(self, serialPort, address, addrLen=8):
@@ -37,12 +216,39 @@ class OwenProtocol:  # Класс, реализующий протокол ОВ
         self.frame = bytearray()  # фрейм
         self.rawFrame = bytearray()  # низкоуровневый фрейм
         self.serialPort = serialPort  # класс последовательного порта
+        self.requestCache = {}  # готовые Raw-фреймы запросов чтения: (адрес, длина адреса, свертка, индекс) -> bytes
         self.address = address
         self.addrLen = addrLen  # длина адреса, может быть 8 или 11 бит
         # self.request = False #признак запроса
         # self.maxRawFrameSize = 44 #максимальная длина Raw-пакета включая маркеры
         self.Debug = False  # режим вывода отладочных сообщений
         self.mutex = Lock()
+        self.parser = None  # потоковый разборщик ответов (OwenFrameParser), None - очистка буфера порта перед запросом
+        self.stats = None  # статистика времени обмена (OwenTransactionStats), None - не собирается
+        self.timeouts = None  # адаптивные таймауты ответа (OwenAdaptiveTimeout), None - таймаут порта не меняется
+        self.retries = 0  # повторы обмена при искаженном ответе (CRC, свертка, формат фрейма)
+        self.breaker = None  # автоматический выключатель неотвечающих адресов (OwenCircuitBreaker)
+
+    def useFrameParser(self, enable=True):
+        """Прием ответов через потоковый разборщик: ответ выбирается по адресу и свертке,
+        эхо запросов и мусор на линии отбрасываются без ожидания таймаута"""
+        self.parser = OwenFrameParser(self) if enable else None
+
+    def discardInput(self):  # отбрасывание принятых, но не прочитанных байтов перед запросом
+        parser = self.parser
+        if parser is not None:  # опоздавший ответ не должен быть принят за ответ на следующий запрос
+            parser.garbage += len(parser.buffer) + self.serialPort.in_waiting
+            parser.reset()
+        self.serialPort.reset_input_buffer()
+
+    @property
+    def addrLen(self):
+        return self._addrLen
+
+    @addrLen.setter
+    def addrLen(self, value):  # при смене длины адреса кэш запросов сбрасывается
+        self._addrLen = value
+        self.requestCache.clear()
 
     def DebugMessage(self, message):#вывод отладочных сообщений
         if self.Debug:
@@ -53,15 +259,31 @@ class OwenProtocol:  # Класс, реализующий протокол ОВ
                 'Frame: {}\nFrame in Raw: {}\nCrc: {} Crc is OK: {}').format(self.address,self.addrLen,self.hash,self.request,self.dataSize,list(self.data),\
                                                          list(self.frame),self.rawFrame,self.crc,self.crcOk)
 
-    def appendIndexAndTime(self,index = -1, time = -1):
-        if not time == -1:
-            self.data += chr((time >> 8) & 0x0f)
-            self.data += chr(time & 0x0f)
-        if not index == -1:
-            self.data += chr((index >> 8) & 0x0f)
-            self.data += chr(index & 0x0f)
+    def appendIndexAndTime(self, data=b'', index=None, time=None):  # добавляет к данным время и индекс (в этом порядке)
+        if time is not None:
+            data += UINT16.pack(time & 0xffff)
+        if index is not None:
+            data += UINT16.pack(index & 0xffff)
+        return data
+
+    def unpackIndex(self, data):  # отделяет индекс (последние 2 байта) от данных, возвращает (данные, индекс)
+        if len(data) < 2:
+            raise OwenUnpackError('OwenUnpackError: Wrong size of data ({}) when index unpacking!'.format(len(data)), data)
+        return data[:-2], UINT16.unpack_from(data, len(data) - 2)[0]
+
+    def owenCRC16(self, data):  # табличный расчет CRC16 (полином 0x8F57)
+        crc = 0
+        for b in data:
+            crc = ((crc << 8) & 0xFFFF) ^ CRC16_TABLE[((crc >> 8) ^ b) & 0xFF]
+        return crc
+
+    def owenHASH(self, data):  # табличный расчет свертки имени (7 значащих бит на байт)
+        crc = 0
+        for b in data:
+            crc = ((crc & 0xFF) << 7) ^ HASH_TABLE[((crc >> 8) ^ (b << 1)) & 0xFF]
+        return crc
 
-    def owenCRC16(self, data):
+    def owenCRC16Bitwise(self, data):  # эталонный побитовый расчет CRC16
         crc = 0
         for b in data:
             crc ^= b << 8
@@ -72,7 +294,7 @@ class OwenProtocol:  # Класс, реализующий протокол ОВ
                     crc = (crc << 1) & 0xFFFF
         return crc
 
-    def owenHASH(self, data):
+    def owenHASHBitwise(self, data):  # эталонный побитовый расчет свертки имени
         crc = 0
         for b in data:
             crc ^= (b << 9) & 0xFF00
@@ -84,6 +306,23 @@ class OwenProtocol:  # Класс, реализующий протокол ОВ
         return crc
 
     def name2hash(self, name: str):
+        """Свертка имени параметра с кэшированием (кэш общий для всех экземпляров), name - строка, содержащая имя локального идентификатора"""
+        hash = NAME_HASH_CACHE.get(name)
+        if hash is None:
+            hash = self.calcNameHash(name)
+            NAME_HASH_CACHE[name] = hash
+            HASH_NAME_INDEX.setdefault(hash, name)  # обратный индекс: первое зарегистрированное имя
+        return hash
+
+    def hash2name(self, hash, default=None):
+        """Имя параметра по свертке (только для имен, уже встречавшихся в name2hash или preloadNames)"""
+        return HASH_NAME_INDEX.get(hash, default)
+
+    def preloadNames(self, names):
+        """Предварительное заполнение кэша сверток списком имен параметров, возвращает словарь имя -> свертка"""
+        return {name: self.name2hash(name) for name in names}
+
+    def calcNameHash(self, name: str):
         """Преобразование локального идентификатора в двоичный вид, name - строка, содержащая имя локального идентификатора"""
         id = [78, 78, 78, 78]
         j = 0
@@ -113,21 +352,21 @@ class OwenProtocol:  # Класс, реализующий протокол ОВ
         return self.owenHASH(id)
 
     def packIEEE32(self, value):  # упаковываем число с плавающей точкой для передачи на устройство
-        return struct.pack('>f', value)
+        return FLOAT32.pack(value)
     
     def packInt16(self, value):  # упаковываем целое число для передачи на устройство
-        return struct.pack('>H', value)
+        return UINT16.pack(value)
 
     # !!!!
     def packFloat24(self, value):  # упаковываем число с плавающей точкой для передачи на устройство
         #print 'inPackingFloat24', value, '=', repr(self.data)
-        return struct.pack('>f', value)[:-1]
+        return FLOAT32.pack(value)[:-1]
 
     def packString(self, value):
         return value[::-1]
 
     def packChar(self, value):  # пакует байт
-        return struct.pack('b', value)
+        return INT8.pack(value)
 
     def unpackIEEE32(self, data, withTime = False, withIndex = False):  # извлекает из данных число с плавающей точкой и время
         dataSize = len(data)
@@ -139,15 +378,13 @@ class OwenProtocol:  # Класс, реализующий протокол ОВ
         if dataSize != 4 + additionalBytes:
             raise OwenUnpackError('OwenUnpackError: Wrong size of data ({0}) when IEEE32 unpacking, should be {1}!'.format(dataSize, (4 + additionalBytes)),\
                                   data)
-        value = struct.unpack('>f', data[0:4])[0]
+        value = FLOAT32.unpack_from(data)[0]
         if withTime:
-            timePos = 4
-            time = (((data[timePos] & 0xff) << 8) | (data[timePos+1] & 0xff )) & 0xffff
+            time = UINT16.unpack_from(data, 4)[0]
         else:
             time = None
         if withIndex:
-            indexPos = 2 + additionalBytes
-            index = (((data[indexPos] & 0xff) << 8) | (data[indexPos+1] & 0xff )) & 0xffff
+            index = UINT16.unpack_from(data, 2 + additionalBytes)[0]
         else:
             index = None
         # result = dict(value = value, time = time, index = index)
@@ -157,31 +394,24 @@ class OwenProtocol:  # Класс, реализующий протокол ОВ
         dataSize = len(data)
         if dataSize != 3:
             raise OwenUnpackError('OwenUnpackError: Wrong size of data ({0}) when float24 unpacking!'.format(dataSize), data)
-        # value = struct.unpack('>f', data[0:3] + b'\x00')[0]
-        # result = dict(value = value, time = -1, index = -1)
-        return struct.unpack('>f', data[0:3] + b'\x00')[0]
+        # младший байт мантиссы дополняется нулем: один временный объект вместо среза и конкатенации
+        return FLOAT32.unpack(bytes(data).ljust(4, b'\x00'))[0]
 
     def unpackInt16(self, data):  # извлекает из данных целое число со знаком
         dataSize = len(data)
         if dataSize < 1:
             raise OwenUnpackError('OwenUnpackError: Wrong size of data ({}) when short int unpacking!'.format(dataSize), data)
         elif dataSize == 1:
-            data = b'\x00' + data  # дополняем до двух байтов
-        # value = ord(self.data[1]) + (ord(self.data[0])<<8 & 0xffff)
-        # value = struct.unpack('>h', data[0:2])[0]
-        # result = dict(value = value, time = -1, index = -1)
-        return struct.unpack('>h', data[0:2])[0]
+            return data[0]  # один байт: старший байт считается нулевым
+        return INT16.unpack_from(data)[0]
 
     def unpackUnsignedInt16(self, data):  # извлекает из данных целое число со знаком
         dataSize = len(data)
         if dataSize < 1:
             raise OwenUnpackError('OwenUnpackError: Wrong size of data ({}) when unsigned short int unpacking!'.format(dataSize), data)
         elif dataSize == 1:
-            data = b'\x00' + data  # дополняем до двух байтов
-        # value = ord(self.data[1]) + (ord(self.data[0])<<8 & 0xffff)
-        # value = struct.unpack('>H', data[0:2])[0]
-        # result = dict(value = value, time = -1, index = -1)
-        return struct.unpack('>H', data[0:2])[0]
+            return data[0]  # один байт: старший байт считается нулевым
+        return UINT16.unpack_from(data)[0]
 
     def unpackString(self, data):  # распаковываем строку
         # value = struct.unpack('>{0}s'.format(len(self.data)),self.data)[0] #почему-то не инвертирует порядок байтов
@@ -193,25 +423,22 @@ class OwenProtocol:  # Класс, реализующий протокол ОВ
         dataSize = len(data)
         if dataSize != 1:
             raise OwenUnpackError('OwenUnpackError: Wrong size of data ({0}) when char unpacking!'.format(dataSize), data)
-        # value = struct.unpack('b', data[:1])[0]
-        # result = dict(value = value, time = -1, index = -1)
-        return struct.unpack('b', data[:1])[0]
+        return INT8.unpack_from(data)[0]
 
     def unpackUnsignedChar(self, data):#извлекает из данных байт без знака, возвращает целый тип
         dataSize = len(data)
         if dataSize != 1:
             raise OwenUnpackError('OwenUnpackError: Wrong size of data ({0}) when char unpacking!'.format(dataSize), data)
-        # value = struct.unpack('B', data[0])[0]
-        # result = dict(value = value, time = -1, index = -1)
-        return struct.unpack('B', data[0])[0]
+        return data[0]
     
     def unpackFrame(self): # расшифровка пакета, проверка контрольной суммы
-        if len(self.frame) < 6:
+        frame = self.frame
+        frameSize = len(frame)
+        if frameSize < 6:
             raise OwenProtocolError('OwenProtocolError: Small length of frame!')
-        # контрольная сумма
-        crc = self.frame[-2] << 8 | self.frame[-1]
-        # int.from_bytes(str1[-2:], 'big')
-        if crc != self.owenCRC16(self.frame[:-2]):
+        # контрольная сумма (копия короткого фрейма быстрее перебора memoryview)
+        crc = UINT16.unpack_from(frame, frameSize - 2)[0]
+        if crc != self.owenCRC16(frame[:-2]):
             raise OwenProtocolError('OwenProtocolError: CRC mismatch!')
         # ВНИМАНИЕ: невозможно отличить 11-битые адреса кратные 8 от 8-битных
         ''' if frame[1] & 0xE0 == 0xE0:
@@ -220,22 +447,22 @@ class OwenProtocol:  # Класс, реализующий протокол ОВ
         else:
             address = frame[0]
             addrLen = 8 '''
-        # запрос
-        request = (self.frame[1] & 0x10) != 0
         # хэш
-        # self.hash = ((self.frame[2] << 8) & 0xff) | self.frame[3]
-        hash = self.frame[2] << 8 | self.frame[3]
+        hash = UINT16.unpack_from(frame, 2)[0]
         #размер данных
-        dataSize = self.frame[1] & 0x0F
+        dataSize = frame[1] & 0x0F
         if dataSize > 0:
-            if dataSize != len(self.frame) - 6:
+            if dataSize != frameSize - 6:
                 raise OwenProtocolError('OwenProtocolError: Wrong data size value in frame!')
-            data = bytes(self.frame[4:4+dataSize])
+            data = bytes(frame[4:4 + dataSize])
         else:
             data = b''
         return hash, data
 
     def unpackRawFrame(self, rawFrame: bytes):
+        self.frame[:] = decodeRawFrame(rawFrame)
+
+    def unpackRawFramePerByte(self, rawFrame: bytes):  # эталонное побайтовое преобразование
         self.frame.clear()
         if rawFrame[0] != ord('#') or rawFrame[-1] != ord('\r'):
             raise OwenProtocolError('OwenProtocolError: Raw buffer does not have start or stop bytes!')
@@ -244,33 +471,36 @@ class OwenProtocol:  # Класс, реализующий протокол ОВ
         # return frame
 
     def packFrame(self, hash, address, request, data):  # формирует массив байтов из данных класса для передачи на устройство, возвращает фрейм в виде b строки
-        self.frame.clear()
-        # frame = bytearray()
+        frame = self.frame
+        dataSize = len(data)
+        resizeBuffer(frame, dataSize + 4)  # буфер переиспользуется, емкость bytearray сохраняется между вызовами
         # адрес
-        if self.addrLen == 8:
-            self.frame.append(address & 0xff)
-            self.frame.append(0)
-        else:
-            self.frame.append((address >> 3) & 0xff)
-            self.frame.append((address & 0x07) << 5)
-        # признак запроса
-        if request:
-            self.frame[1] |= 0x10
+        if self._addrLen == 8:
+            addrHigh = address & 0xff
+            addrLow = 0
         else:
-            self.frame[1] |= len(data)  # размер данных
-        # хэш
-        self.frame.append((hash >> 8) & 0xff)
-        self.frame.append(hash & 0xff)
+            addrHigh = (address >> 3) & 0xff
+            addrLow = (address & 0x07) << 5
+        # признак запроса и размер данных (запрос индексированного параметра содержит индекс)
+        addrLow |= dataSize | 0x10 if request else dataSize
+        # адрес и хэш
+        FRAME_HEADER.pack_into(frame, 0, addrHigh, addrLow, hash & 0xffff)
         # данные
-        self.frame.extend(data)
-        # контрольная сумма
-        crc = self.owenCRC16(self.frame)
-        self.frame.append((crc >> 8) & 0xff)
-        self.frame.append(crc & 0xff)
-        # frameStr += crc.to_bytes(2, 'big')
-        # return frame
+        frame[4:4 + dataSize] = data
+        # контрольная сумма (дописывается в пределах выделенной емкости буфера)
+        frame += UINT16.pack(self.owenCRC16(frame))
 
     def packRawFrame(self):  # преобразуем бинарные данные в строковый вид
+        frame = self.frame
+        rawFrame = self.rawFrame
+        rawSize = 2 * len(frame) + 2
+        resizeBuffer(rawFrame, rawSize)
+        rawFrame[0] = 0x23  # стартовый символ '#'
+        rawFrame[1:rawSize - 1:2] = frame.translate(TETRAD_HI_ENCODE)  # первые тетрады
+        rawFrame[2:rawSize - 1:2] = frame.translate(TETRAD_LO_ENCODE)  # вторые тетрады
+        rawFrame[rawSize - 1] = 0x0D  # стоповый символ '\r'
+
+    def packRawFramePerByte(self):  # эталонное побайтовое преобразование
         self.rawFrame.clear()
         # rawFrame = bytearray()
         self.rawFrame.append(ord('#'))  # стартовый символ
@@ -280,36 +510,262 @@ class OwenProtocol:  # Класс, реализующий протокол ОВ
         self.rawFrame.append(ord('\r'))
         # return rawFrame
 
+    def packRequest(self, hash, address, data=b''):  # Raw-фрейм запроса чтения из кэша, при отсутствии формируется и кэшируется
+        key = (address, self._addrLen, hash, bytes(data))  # data - индекс для индексированных параметров
+        rawRequest = self.requestCache.get(key)
+        if rawRequest is None:
+            self.packFrame(hash, address, True, data)
+            self.packRawFrame()
+            rawRequest = bytes(self.rawFrame)
+            self.requestCache[key] = rawRequest
+        return rawRequest
+
+    def packPing(self, hash, address, name, request=True, data=b''):  # Raw-фрейм запроса (общий для синхронного и асинхронного обмена)
+        if request:
+            rawRequest = self.packRequest(hash, address, data)
+        else:
+            self.packFrame(hash, address, request, data)
+            if self.Debug:
+                self.DebugMessage('Sending::data: {}'.format(list(data)))
+            self.packRawFrame()
+            rawRequest = self.rawFrame
+        if self.Debug:  # строки форматируются только в режиме отладки
+            self.DebugMessage('Sending::raw frame size: {0}  addr: {1:#x} hash: {2:#x} ({3})'.format(len(rawRequest), address, hash, name))
+            self.DebugMessage('Sent: {}'.format(rawRequest))
+        return rawRequest
+
+    def unpackPong(self, hash, name, rawFrameRet):  # разбор Raw-фрейма ответа, возвращает данные
+        rawFrameSize = len(rawFrameRet)
+        if rawFrameSize == 0:
+            raise OwenTimeoutError('OwenProtocolError: No data are received from serial port!')
+        if self.Debug:
+            self.DebugMessage('Reading::Length: {1} Recieved: {0}'.format(rawFrameRet, rawFrameSize))
+        self.unpackRawFrame(rawFrameRet)
+        retHash, dataRet = self.unpackFrame()
+        if retHash != hash:
+            raise OwenProtocolError('OwenProtocolError: Hash mismatch! Expected {:#x} ({}), received {:#x} ({})'.format(
+                hash, name, retHash, self.hash2name(retHash, '?')))
+        if self.Debug:
+            self.DebugMessage('Reading::data size: {0}'.format(len(dataRet)))
+            self.DebugMessage('Reading::data: {0}'.format(list(dataRet)))
+        return dataRet
+
+    def readPong(self, hash, address, name, firstByte=None):  # чтение ответа через потоковый разборщик, возвращает данные
+        """firstByte - список, в который добавляется время получения первых байтов (для статистики)"""
+        timeout = getattr(self.serialPort, 'timeout', None)
+        deadline = None if timeout is None else time() + timeout
+        address &= 0xFF if self._addrLen == 8 else 0x7FF
+        while True:
+            chunk = self.serialPort.read(self.serialPort.in_waiting or 1)
+            if firstByte is not None and chunk and not firstByte:
+                firstByte.append(perf_counter())
+            for frame in self.parser.feed(chunk):
+                if not frame.request and frame.hash == hash and frame.address == address:
+                    if self.Debug:
+                        self.DebugMessage('Reading::data: {0}'.format(list(frame.data)))
+                    return frame.data
+                if self.Debug:
+                    self.DebugMessage('Reading::skipped frame addr: {0:#x} hash: {1:#x} ({2}) request: {3}'.format(
+                        frame.address, frame.hash, self.hash2name(frame.hash, '?'), frame.request))
+            if deadline is not None and time() >= deadline:
+                raise OwenTimeoutError('OwenProtocolError: No response from address {} for {} is received from serial port!'.format(address, name))
+
     def getPingPong(self, address, name, request=True, data=b''):  # отправка фрейма запроса, получение ответа
         hash = self.name2hash(name)
         self.mutex.acquire()    # блокируем поток
         try:
             # address = self.baseAddress + addrOffset
-            self.packFrame(hash, address, request, data)
-            self.DebugMessage('Sending::frame size: {0}  addr: {1:#x} hash: {2:#x}'.format(len(self.frame), address, hash))
-            if not request:
-                self.DebugMessage('Sending::data: {}'.format(list(data)))
-            self.packRawFrame()
-            self.DebugMessage('Sent: {}'.format(self.rawFrame))
-            self.serialPort.reset_input_buffer()  # очищаем буфер чтения
-            self.serialPort.write(self.rawFrame)
-            # ------
-            rawFrameRet = self.serialPort.read_until(b'\r')
-            # print(type(rawFrame_ret), id(rawFrame_ret))
-            rawFrameSize = len(rawFrameRet)
-            if rawFrameSize == 0:
-                raise OwenProtocolError('OwenProtocolError: No data are received from serial port!')
-            self.DebugMessage('Reading::Length: {1} Recieved: {0}'.format(rawFrameRet, rawFrameSize))
-            self.unpackRawFrame(rawFrameRet)
-            retHash, dataRet = self.unpackFrame()
-            if retHash != hash:
-                raise OwenProtocolError('OwenProtocolError: Hash mismatch!')
-            self.DebugMessage('Reading::data size: {0}'.format(len(data)))
-            self.DebugMessage('Reading::data: {0}'.format(list(data)))
+            return self.pingPong(hash, address, name, request, data)
         finally:
             self.mutex.release()
+
+    def getPingPongByHash(self, hash, address, name, request=True, data=b''):  # getPingPong с заранее вычисленной сверткой
+        self.mutex.acquire()    # блокируем поток
+        try:
+            return self.pingPong(hash, address, name, request, data)
+        finally:
+            self.mutex.release()
+
+    def pingPong(self, hash, address, name, request=True, data=b''):  # обмен с прибором, мьютекс должен быть захвачен
+        if self.retries or self.breaker is not None:
+            return self.pingPongGuarded(hash, address, name, request, data)
+        return self.pingPongOnce(hash, address, name, request, data)
+
+    def pingPongGuarded(self, hash, address, name, request=True, data=b''):  # pingPong с повторами и выключателем
+        breaker = self.breaker
+        if breaker is not None and not breaker.allow(address):
+            raise OwenCircuitOpenError('OwenProtocolError: Address {} is out of rotation after repeated failures!'.format(address),
+                                       address, breaker.retryTime(address))
+        attempt = 0
+        while True:
+            try:
+                dataRet = self.pingPongOnce(hash, address, name, request, data)
+                break
+            except OwenTimeoutError:  # нет ответа: повтор только занял бы шину еще на один таймаут
+                if breaker is not None:
+                    breaker.failure(address)
+                raise
+            except OwenProtocolError:  # искаженный ответ (CRC, свертка): повтор
+                if attempt < self.retries:
+                    attempt += 1
+                    self.DebugMessage('Retry {} of {} for address {} ({})'.format(attempt, self.retries, address, name))
+                    continue
+                if breaker is not None:
+                    breaker.failure(address)
+                raise
+        if breaker is not None:
+            breaker.success(address)
+        return dataRet
+
+    def pingPongOnce(self, hash, address, name, request=True, data=b''):  # один обмен с прибором
+        if self.stats is not None or self.timeouts is not None:
+            return self.pingPongTimed(hash, address, name, request, data)
+        rawRequest = self.packPing(hash, address, name, request, data)
+        self.discardInput()  # очищаем буфер чтения
+        self.serialPort.write(rawRequest)
+        if self.parser is not None:
+            return self.readPong(hash, address, name)
+        # ------
+        rawFrameRet = self.serialPort.read_until(b'\r')
+        # print(type(rawFrame_ret), id(rawFrame_ret))
+        return self.unpackPong(hash, name, rawFrameRet)
+
+    def pingPongTimed(self, hash, address, name, request=True, data=b''):  # pingPong с замером времени этапов обмена
+        stats = self.stats
+        timeouts = self.timeouts
+        try:
+            if timeouts is not None:
+                timeouts.apply(self.serialPort, address)
+            t0 = perf_counter()
+            rawRequest = self.packPing(hash, address, name, request, data)
+            t1 = perf_counter()
+            self.discardInput()  # очищаем буфер чтения
+            self.serialPort.write(rawRequest)
+            t2 = perf_counter()
+            if self.parser is not None:  # разбор выполняется по мере приема, время разбора входит в чтение
+                firstByte = []
+                dataRet = self.readPong(hash, address, name, firstByte)
+                t4 = t5 = perf_counter()
+                t3 = firstByte[0] if firstByte else t4
+            else:
+                rawFrameRet = self.serialPort.read(1)
+                t3 = perf_counter()
+                if rawFrameRet and rawFrameRet != b'\r':
+                    rawFrameRet += self.serialPort.read_until(b'\r')
+                t4 = perf_counter()
+                dataRet = self.unpackPong(hash, name, rawFrameRet)
+                t5 = perf_counter()
+            if stats is not None:
+                stats.record(address, name, (t1 - t0, t2 - t1, t3 - t2, t4 - t3, t5 - t4, t5 - t0))
+            if timeouts is not None:
+                timeouts.update(address, t4 - t2)
+        except Exception as e:
+            if stats is not None:
+                stats.recordError(address, name, e)
+            if timeouts is not None and isinstance(e, OwenTimeoutError):
+                timeouts.expired(address)
+            raise
         return dataRet
 
+    def readMany(self, items, address=None, stopOnTimeout=False):
+        """Чтение нескольких параметров за один захват шины. items - список (имя, тип), тип по имени
+        метода распаковки ('Int16' -> unpackInt16) или функция распаковки decode(data). Возвращает кортеж (значения, ошибки):
+        словари имя -> значение и имя -> исключение OwenError для параметров, которые не удалось прочитать.
+        stopOnTimeout - после первого OwenTimeoutError остальные параметры не читаются (нет ни в одном словаре)"""
+        if address is None:
+            address = self.address
+        requests = [(name, self.name2hash(name), type if callable(type) else getattr(self, 'unpack' + type)) for name, type in items]
+        values = {}
+        errors = {}
+        self.mutex.acquire()    # блокируем поток на весь пакет запросов
+        try:
+            for name, hash, decoder in requests:
+                try:
+                    values[name] = decoder(self.pingPong(hash, address, name))
+                except OwenError as e:
+                    errors[name] = e
+                    if stopOnTimeout and isinstance(e, OwenTimeoutError):
+                        break  # прибор не отвечает: не ждем таймаут на каждом параметре
+        finally:
+            self.mutex.release()
+        return values, errors
+
+    def decodeIndexed(self, data, decoder, index):  # значение индексированного параметра с проверкой индекса ответа
+        data, retIndex = self.unpackIndex(data)
+        if retIndex != index:
+            raise OwenProtocolError('OwenProtocolError: Index mismatch! Expected {}, received {}'.format(index, retIndex))
+        value = decoder(data)
+        return value[0] if type(value) is tuple else value  # IEEE32: (значение, время, индекс)
+
+    def getIndexed(self, name, index, type='Float24', address=None):
+        """Чтение индексированного параметра (канала многоканального прибора): индекс передается в запросе,
+        ответ содержит значение и индекс. type - тип данных по имени метода распаковки"""
+        if address is None:
+            address = self.address
+        data = self.getPingPong(address, name, True, UINT16.pack(index))
+        return self.decodeIndexed(data, getattr(self, 'unpack' + type), index)
+
+    def writeIndexed(self, name, index, value, type='Float24', address=None):  # запись индексированного параметра
+        if address is None:
+            address = self.address
+        data = self.appendIndexAndTime(getattr(self, 'pack' + type)(value), index)
+        data = self.getPingPong(address, name, False, data)
+        return self.decodeIndexed(data, getattr(self, 'unpack' + type), index)
+
+    def readChannels(self, name, indices, type='Float24', address=None):
+        """Чтение индексированного параметра по списку индексов за один захват шины (запросы из кэша, без пауз).
+        Возвращает кортеж (значения, ошибки): array('d') в порядке indices (NaN для неудачных чтений)
+        и словарь индекс -> исключение OwenError"""
+        if address is None:
+            address = self.address
+        hash = self.name2hash(name)
+        decoder = getattr(self, 'unpack' + type)
+        values = array('d', bytes(8 * len(indices)))
+        errors = {}
+        self.mutex.acquire()    # блокируем поток на все каналы
+        try:
+            for i, index in enumerate(indices):
+                try:
+                    values[i] = self.decodeIndexed(self.pingPong(hash, address, name, True, UINT16.pack(index)), decoder, index)
+                except OwenError as e:
+                    values[i] = float('nan')
+                    errors[index] = e
+        finally:
+            self.mutex.release()
+        return values, errors
+
+    def enableStats(self, enable=True):
+        """Включение сбора статистики времени обмена (OwenTransactionStats в атрибуте stats)"""
+        self.stats = OwenTransactionStats() if enable else None
+        return self.stats
+
+    def enableAdaptiveTimeouts(self, enable=True, baudRate=None, **kwargs):
+        """Включение адаптивных таймаутов ответа по адресам (OwenAdaptiveTimeout в атрибуте timeouts).
+        baudRate по умолчанию берется из порта, kwargs передаются в OwenAdaptiveTimeout.
+        Таймаут порта запоминается при включении и восстанавливается при выключении"""
+        previous = self.timeouts
+        if not enable:
+            if previous is not None and self.serialPort is not None:
+                self.serialPort.timeout = previous.portTimeout
+            self.timeouts = None
+            return None
+        if baudRate is None:
+            baudRate = getattr(self.serialPort, 'baudrate', 115200)
+        self.timeouts = OwenAdaptiveTimeout(baudRate, **kwargs)
+        self.timeouts.portTimeout = getattr(self.serialPort, 'timeout', None) if previous is None else previous.portTimeout
+        return self.timeouts
+
+    def enableCircuitBreaker(self, enable=True, retries=2, **kwargs):
+        """Повторы при искаженном ответе (retries) и исключение неотвечающих адресов из обмена
+        (OwenCircuitBreaker в атрибуте breaker, kwargs передаются в OwenCircuitBreaker)"""
+        if not enable:
+            self.retries = 0
+            self.breaker = None
+            return None
+        self.retries = retries
+        self.breaker = OwenCircuitBreaker(**kwargs)
+        return self.breaker
+
     def getInt16(self, name, address=None):  # возвращает целочисленный параметр
         if address is None:
             address = self.address
@@ -355,9 +811,395 @@ class OwenProtocol:  # Класс, реализующий протокол ОВ
         return self.unpackChar(data)
 
 
+class OwenLatencyHistogram:  # Гистограмма времени с логарифмической шкалой (от 10 мкс до ~5 с)
+    bounds = tuple(1e-5 * 2 ** i for i in range(20))  # верхние границы интервалов (с)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def percentile(self, p):  # оценка процентиля (верхняя граница интервала)
+        if not self.count:
+            return None
+        rank = p / 100 * self.count
+        accumulated = 0
+        for i, count in enumerate(self.counts):
+            accumulated += count
+            if accumulated >= rank and count:
+                return min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+        return self.max
+
+    def summary(self):
+        return {'count': self.count, 'mean': self.mean(), 'min': self.min, 'p50': self.percentile(50),
+                'p90': self.percentile(90), 'p99': self.percentile(99), 'max': self.max}
+
+
+class OwenTransactionStats:  # Статистика времени этапов обмена и ошибок по (адрес, параметр)
+    """Attributes:
+        histograms -- (адрес, имя) -> {этап: OwenLatencyHistogram}
+        errors     -- (адрес, имя) -> {имя класса исключения: количество}
+    Этапы: encode - формирование запроса, write - запись в порт, firstByte - ожидание первого байта ответа,
+    read - прием ответа до конца, decode - разбор ответа, total - весь обмен
+    """
+    phases = ('encode', 'write', 'firstByte', 'read', 'decode', 'total')
+
+    def __init__(self):
+        self.histograms = {}
+        self.errors = {}
+
+    def record(self, address, name, times):
+        histograms = self.histograms.get((address, name))
+        if histograms is None:
+            histograms = self.histograms[(address, name)] = {phase: OwenLatencyHistogram() for phase in self.phases}
+        for phase, value in zip(self.phases, times):
+            histograms[phase].add(value)
+
+    def recordError(self, address, name, error):
+        errors = self.errors.setdefault((address, name), {})
+        errorName = type(error).__name__
+        errors[errorName] = errors.get(errorName, 0) + 1
+
+    def summary(self):
+        """Словарь (адрес, имя) -> {этап: {count, mean, min, p50, p90, p99, max}, 'errors': {...}} (время в секундах)"""
+        result = {}
+        for key in set(self.histograms) | set(self.errors):
+            histograms = self.histograms.get(key, {})
+            result[key] = {phase: histogram.summary() for phase, histogram in histograms.items()}
+            result[key]['errors'] = dict(self.errors.get(key, {}))
+        return result
+
+    def reset(self):
+        self.histograms.clear()
+        self.errors.clear()
+
+
+class OwenAdaptiveTimeout:  # Адаптивный таймаут ответа для каждого адреса по наблюдаемому времени ответа
+    """Таймаут вычисляется как в TCP (RFC 6298): сглаженное время ответа + 4 отклонения + запас.
+    Начальное значение - время передачи запроса и ответа максимальной длины на заданной скорости плюс
+    задержка ответа прибора (rSdL, см. seed). При отсутствии ответа таймаут адреса удваивается
+    (не больше чем в maxBackoff раз и не больше maxTimeout) до первого удачного обмена, поэтому
+    неотвечающий прибор занимает шину на единицы-десятки миллисекунд, а не на таймаут порта.
+    Attributes:
+        baudRate     -- скорость обмена (бод)
+        minTimeout   -- минимальный таймаут (с)
+        maxTimeout   -- максимальный таймаут (с)
+        margin       -- запас на задержки ОС и преобразователя интерфейса (с)
+        defaultDelay -- задержка ответа прибора до вызова seed (с)
+        maxBackoff   -- максимальный множитель таймаута при отсутствии ответов
+    """
+    bitsPerChar = 11  # старт + 8 бит данных + четность + стоп (с запасом для 8N1)
+    maxRawFrameSize = 44  # максимальная длина Raw-фрейма (символов)
+
+    def __init__(self, baudRate=115200, minTimeout=0.005, maxTimeout=1.0, margin=0.01, defaultDelay=0.05, maxBackoff=2):
+        self.baudRate = baudRate
+        self.minTimeout = minTimeout
+        self.maxTimeout = maxTimeout
+        self.margin = margin
+        self.defaultDelay = defaultDelay
+        self.maxBackoff = maxBackoff
+        self.devices = {}  # адрес -> [сглаженное время, отклонение, множитель отсрочки]
+        self.seeds = {}  # адрес -> начальный таймаут
+        self.portTimeout = None  # таймаут порта до включения адаптивных таймаутов (восстанавливается при выключении)
+
+    def transferTime(self, baudRate=None):  # время передачи запроса и ответа максимальной длины (с)
+        return 2 * self.maxRawFrameSize * self.bitsPerChar / (baudRate or self.baudRate)
+
+    def seed(self, address, answerDelay, baudRate=None):
+        """Начальный таймаут по задержке ответа прибора answerDelay (мс, параметр rSdL) и скорости обмена"""
+        if baudRate is not None:
+            self.baudRate = baudRate
+        self.seeds[address] = self.transferTime() + answerDelay / 1000 + self.margin
+
+    def timeout(self, address):  # текущий таймаут для адреса (с)
+        device = self.devices.get(address)
+        if device is None or device[0] is None:
+            timeout = self.seeds.get(address)
+            if timeout is None:
+                timeout = self.transferTime() + self.defaultDelay + self.margin
+            backoff = 1 if device is None else device[2]
+        else:
+            timeout = device[0] + 4 * device[1] + self.margin
+            backoff = device[2]
+        return min(self.maxTimeout, max(self.minTimeout, timeout * backoff))
+
+    def apply(self, serialPort, address):  # установка таймаута порта перед обменом с адресом
+        timeout = round(self.timeout(address), 3)  # шаг 1 мс, чтобы не перенастраивать порт при каждом обмене
+        if serialPort.timeout != timeout:
+            serialPort.timeout = timeout
+        return timeout
+
+    def update(self, address, responseTime):  # учет времени удачного ответа (с)
+        device = self.devices.get(address)
+        if device is None or device[0] is None:
+            self.devices[address] = [responseTime, responseTime / 2, 1]
+        else:
+            device[1] = 0.75 * device[1] + 0.25 * abs(device[0] - responseTime)
+            device[0] = 0.875 * device[0] + 0.125 * responseTime
+            device[2] = 1
+
+    def expired(self, address):  # ответ не получен за время таймаута
+        device = self.devices.setdefault(address, [None, None, 1])
+        device[2] = min(self.maxBackoff, device[2] * 2)
+
+
+class OwenCircuitBreaker:  # Автоматический выключатель: исключение неотвечающих адресов из обмена
+    """После threshold неудачных обменов подряд адрес исключается из обмена: запросы к нему сразу завершаются
+    OwenCircuitOpenError, не занимая шину. Через probeInterval секунд выполняется один пробный запрос;
+    при неудаче интервал проб удваивается (до maxProbeInterval), при удаче адрес возвращается в обмен.
+    Attributes:
+        threshold        -- количество неудачных обменов подряд до исключения адреса
+        probeInterval    -- начальный интервал пробных запросов (с)
+        maxProbeInterval -- максимальный интервал пробных запросов (с)
+        devices          -- адрес -> [неудач подряд, время следующей пробы или None, текущий интервал проб]
+    """
+    def __init__(self, threshold=3, probeInterval=1.0, maxProbeInterval=60.0):
+        self.threshold = threshold
+        self.probeInterval = probeInterval
+        self.maxProbeInterval = maxProbeInterval
+        self.devices = {}
+
+    def allow(self, address, now=None):  # можно ли выполнить обмен с адресом (при открытом выключателе - проба)
+        device = self.devices.get(address)
+        if device is None or device[1] is None:
+            return True
+        now = time() if now is None else now
+        if now < device[1]:
+            return False
+        device[1] = now + device[2]  # одна проба за интервал, следующая - после ее результата или интервала
+        return True
+
+    def retryTime(self, address):  # время (monotonic) следующей пробы или None, если адрес в обмене
+        device = self.devices.get(address)
+        return None if device is None else device[1]
+
+    def isOpen(self, address):
+        return self.retryTime(address) is not None
+
+    def openAddresses(self):  # адреса, исключенные из обмена
+        return [address for address, device in self.devices.items() if device[1] is not None]
+
+    def success(self, address):
+        if address in self.devices:
+            del self.devices[address]
+
+    def failure(self, address, now=None):
+        now = time() if now is None else now
+        device = self.devices.setdefault(address, [0, None, self.probeInterval])
+        device[0] += 1
+        if device[1] is not None:  # неудачная проба
+            device[2] = min(self.maxProbeInterval, device[2] * 2)
+            device[1] = now + device[2]
+        elif device[0] >= self.threshold:
+            device[1] = now + device[2]
+
+    def reset(self, address=None):  # возврат адреса (или всех адресов) в обмен
+        if address is None:
+            self.devices.clear()
+        else:
+            self.success(address)
+
+
+OwenFrame = namedtuple('OwenFrame', 'address request hash data')  # разобранный фрейм
+
+class OwenFrameParser:  # Потоковый разборщик фреймов с ресинхронизацией по стартовому символу
+    """Принимает произвольные куски байтов (feed) и выдает полностью принятые фреймы с верной CRC.
+    Данные до символа '#', незавершенные фреймы, прерванные новым '#', и фреймы с ошибками отбрасываются.
+    Attributes:
+        owen    -- экземпляр OwenProtocol (длина адреса, расчет CRC)
+        garbage -- количество отброшенных байтов вне фреймов
+        errors  -- количество отброшенных фреймов с ошибками
+    """
+    maxRawFrameSize = 44  # максимальная длина Raw-фрейма, включая стартовый и стоповый символы
+
+    def __init__(self, owen):
+        self.owen = owen
+        self.buffer = bytearray()
+        self.garbage = 0
+        self.errors = 0
+
+    def reset(self):
+        self.buffer.clear()
+
+    def feed(self, chunk):
+        """Генератор разобранных фреймов OwenFrame; непрочитанные фреймы остаются в буфере до следующего вызова"""
+        buffer = self.buffer
+        buffer += chunk
+        while True:
+            start = buffer.find(b'#')
+            if start < 0:
+                self.garbage += len(buffer)
+                buffer.clear()
+                return
+            if start > 0:
+                self.garbage += start
+                del buffer[:start]
+            stop = buffer.find(b'\r', 1)
+            if stop < 0:
+                if len(buffer) >= self.maxRawFrameSize:  # стоповый символ потерян
+                    restart = buffer.find(b'#', 1)
+                    restart = len(buffer) if restart < 0 else restart
+                    self.garbage += restart
+                    del buffer[:restart]
+                    continue
+                return
+            restart = buffer.rfind(b'#', 1, stop)
+            if restart > 0:  # начало нового фрейма внутри незавершенного
+                self.garbage += restart
+                del buffer[:restart]
+                continue
+            rawFrame = bytes(buffer[:stop + 1])
+            del buffer[:stop + 1]
+            try:
+                frame = self.decode(rawFrame)
+            except OwenError:
+                self.errors += 1
+                continue
+            yield frame
+
+    def decode(self, rawFrame):  # разбор Raw-фрейма в OwenFrame с проверкой CRC
+        frame = decodeRawFrame(rawFrame)
+        if len(frame) < 6:
+            raise OwenProtocolError('OwenProtocolError: Small length of frame!')
+        if frame[-2] << 8 | frame[-1] != self.owen.owenCRC16(frame[:-2]):
+            raise OwenProtocolError('OwenProtocolError: CRC mismatch!')
+        dataSize = frame[1] & 0x0F
+        if dataSize > 0 and dataSize != len(frame) - 6:
+            raise OwenProtocolError('OwenProtocolError: Wrong data size value in frame!')
+        if self.owen.addrLen == 8:
+            address = frame[0]
+        else:
+            address = frame[0] << 3 | frame[1] >> 5
+        return OwenFrame(address, (frame[1] & 0x10) != 0, frame[2] << 8 | frame[3], frame[4:4 + dataSize])
+
+
+class OwenResponseCache:  # Кэш ответов чтения по (адрес, свертка, данные запроса) с временем жизни для каждого параметра
+    """Кэшируются только параметры, для которых задано время жизни (setTTL). Ответ моложе ttl возвращается
+    без обмена с прибором. Ответ старше ttl, но моложе ttl + stale, тоже возвращается сразу, а параметр
+    перечитывается в фоне (stale-while-revalidate). Более старый ответ читается с прибора заново.
+    Запись параметра сбрасывает его кэш (см. OwenDevice.pingPong). Ответы на запросы с данными (индексированные
+    параметры) кэшируются отдельно для каждого индекса, запись сбрасывает кэш всех индексов параметра.
+    Attributes:
+        ttl       -- свертка имени -> (время жизни, время использования устаревшего ответа) (с)
+        entries   -- (адрес, свертка, данные запроса) -> (время получения, данные ответа)
+        hits      -- количество ответов из кэша
+        staleHits -- количество устаревших ответов из кэша (с фоновым обновлением)
+        misses    -- количество чтений с прибора
+    """
+    def __init__(self):
+        self.ttl = {}
+        self.entries = {}
+        self.hits = 0
+        self.staleHits = 0
+        self.misses = 0
+
+    def setTTL(self, hash, ttl, stale=0.0):  # ttl=None - параметр не кэшируется, float('inf') - до сброса кэша
+        if ttl is None:
+            self.ttl.pop(hash, None)
+            self.invalidate(hash=hash)
+        else:
+            self.ttl[hash] = (ttl, stale)
+
+    def lookup(self, address, hash, now, request=b''):
+        """Возвращает (данные, устарели) или None, если параметр не кэшируется или ответ слишком старый.
+        request - данные запроса (индекс индексированного параметра)"""
+        ttl = self.ttl.get(hash)
+        if ttl is None:
+            return None
+        entry = self.entries.get((address, hash, request))
+        if entry is not None:
+            age = now - entry[0]
+            if age < ttl[0]:
+                self.hits += 1
+                return entry[1], False
+            if age < ttl[0] + ttl[1]:
+                self.staleHits += 1
+                return entry[1], True
+        self.misses += 1
+        return None
+
+    def store(self, address, hash, data, now, request=b''):
+        if hash in self.ttl:
+            self.entries[(address, hash, bytes(request))] = (now, data)
+
+    def invalidate(self, address=None, hash=None):  # сброс кэша адреса, параметра (всех индексов) или всего кэша
+        if address is None and hash is None:
+            self.entries.clear()
+            return
+        for key in [key for key in self.entries if address in (None, key[0]) and hash in (None, key[1])]:
+            del self.entries[key]
+
+
 class OwenDevice(OwenProtocol):
+    networkSettingsNames = ('bps', 'Len', 'PrtY', 'A.Len', 'Addr', 'sbit', 'n.Err', 'rSdL')  # параметры getNetworkSettings
+    baudRates = (2400, 4800, 9600, 14400, 19200, 28800, 38400, 57600, 115200)  # значения параметра bps
+
+    cacheTTL = {'dev': float('inf'), 'ver': float('inf'),  # время жизни ответов по умолчанию для enableCache (с)
+                'bps': 60, 'Len': 60, 'PrtY': 60, 'A.Len': 60, 'Addr': 60, 'sbit': 60, 'rSdL': 60}
+
     def __init__(self, serialPort, address, addrLen=8):
         super().__init__(serialPort, address, addrLen)
+        self.cache = None  # OwenResponseCache (enableCache)
+        self.revalidating = set()  # (адрес, свертка, данные запроса) параметров, обновляемых в фоне
+
+    def enableCache(self, enable=True, ttl=None, stale=0.0):
+        """Включение кэша ответов чтения (OwenResponseCache в атрибуте cache).
+        ttl   -- словарь имя -> время жизни (с), по умолчанию cacheTTL
+        stale -- время использования устаревшего ответа с обновлением в фоне (с)"""
+        if not enable:
+            self.cache = None
+            return None
+        self.cache = OwenResponseCache()
+        for name, value in (self.cacheTTL if ttl is None else ttl).items():
+            self.setCacheTTL(name, value, stale)
+        return self.cache
+
+    def setCacheTTL(self, name, ttl, stale=0.0):  # время жизни ответов параметра, None - не кэшировать
+        self.cache.setTTL(self.name2hash(name), ttl, stale)
+
+    def pingPong(self, hash, address, name, request=True, data=b''):  # обмен с учетом кэша ответов
+        cache = self.cache
+        if cache is None:
+            return super().pingPong(hash, address, name, request, data)
+        if not request:  # запись изменяет параметр: кэш сбрасывается
+            cache.invalidate(address, hash)
+            return super().pingPong(hash, address, name, request, data)
+        now = time()
+        data = bytes(data)
+        cached = cache.lookup(address, hash, now, data)
+        if cached is not None:
+            if cached[1] and (address, hash, data) not in self.revalidating:
+                self.revalidating.add((address, hash, data))
+                Thread(target=self.revalidate, args=(cache, hash, address, name, data), daemon=True).start()
+            return cached[0]
+        dataRet = super().pingPong(hash, address, name, request, data)
+        cache.store(address, hash, dataRet, now, data)
+        return dataRet
+
+    def revalidate(self, cache, hash, address, name, data=b''):  # фоновое обновление устаревшего ответа
+        self.mutex.acquire()
+        try:
+            now = time()
+            cache.store(address, hash, super().pingPong(hash, address, name, True, data), now, data)
+        except OwenError as e:
+            self.DebugMessage('Revalidate error: {}'.format(e))  # ответ останется устаревшим до истечения stale
+        finally:
+            self.revalidating.discard((address, hash, data))
+            self.mutex.release()
 
     def getDeviceName(self, address=None):  # возвращает имя устройства
         return self.getString('dev', address).decode('cp1251')
@@ -366,14 +1208,26 @@ class OwenDevice(OwenProtocol):
         return self.getString('ver', address).decode('cp1251')
 
     def getNetworkSettings(self, address=None):  # возвращает сетевые параметры прибора
-        baudRate = [2400, 4800, 9600, 14400, 19200, 28800, 38400, 57600, 115200][self.getInt16('bps', address)]  # Скорость обмена (бод)
-        bits = [7, 8][self.getInt16('Len', address)]  # Длина слова данных (бит)
-        parity = ['No', 'EuEn', 'Odd'][self.getInt16('PrtY', address)]  # Состояние бита четности в посылке
-        addressLength = [8, 11][self.getInt16('A.Len', address)]  # Длина сетевого адреса (бит)
-        baseAddress = self.getInt16('Addr', address)  # Базовый адрес прибора
-        stopBits = [1, 2][self.getInt16('sbit', address)]  # Количество стоп-битов в посылке
-        errorNumber = self.getInt16('n.Err', address)  # Код сетевой ошибки при последнем обращении к прибору.
-        answerDelay = self.getInt16('rSdL', address)  # Задержка ответа от прибора по RS485 (мс)
+        values, errors = self.readMany([(name, 'Int16') for name in self.networkSettingsNames], address, True)
+        if errors:
+            raise next(iter(errors.values()))
+        values = [values[name] for name in self.networkSettingsNames]
+        self.seedTimeout(address, values)
+        return self.formatNetworkSettings(values)
+
+    def seedTimeout(self, address, values):  # начальный адаптивный таймаут по прочитанным сетевым параметрам
+        if self.timeouts is not None:
+            self.timeouts.seed(self.address if address is None else address, values[7], self.baudRates[values[0]])
+
+    def formatNetworkSettings(self, values):  # форматирует значения параметров networkSettingsNames
+        bps, bitsIndex, parityIndex, addrLenIndex, baseAddress, stopBitsIndex, errorNumber, answerDelay = values
+        baudRate = self.baudRates[bps]  # Скорость обмена (бод)
+        bits = [7, 8][bitsIndex]  # Длина слова данных (бит)
+        parity = ['No', 'EuEn', 'Odd'][parityIndex]  # Состояние бита четности в посылке
+        addressLength = [8, 11][addrLenIndex]  # Длина сетевого адреса (бит)
+        stopBits = [1, 2][stopBitsIndex]  # Количество стоп-битов в посылке
+        # baseAddress - Базовый адрес прибора, errorNumber - Код сетевой ошибки при последнем обращении к прибору,
+        # answerDelay - Задержка ответа от прибора по RS485 (мс)
         return 'Baud rate: {}, Bit length: {}, Parity: {}, Stop bits: {}, ' \
                'Base address: {}, Address length: {}, Last error: {}, ' \
-               'Answer delay: {}'.format(baudRate, bits, parity, stopBits, baseAddress, addressLength, errorNumber, answerDelay)
\ No newline at end of file
+               'Answer delay: {}'.format(baudRate, bits, parity, stopBits, baseAddress, addressLength, errorNumber, answerDelay)
@@ -0,0 +1,267 @@
+import asyncio
+from array import array
+from time import perf_counter
+from Owen import OwenProtocol, OwenDevice, OwenFrameParser, OwenError, OwenProtocolError, OwenTimeoutError, \
+    OwenCircuitOpenError, UINT16
+try:
+    import serial_asyncio  # пакет pyserial-asyncio, нужен только для openSerial
+except ImportError:
+    serial_asyncio = None
+
+class AsyncOwenProtocol(OwenProtocol):  # Асинхронный (asyncio) вариант OwenProtocol поверх потокового транспорта
+    """Фреймы формируются теми же методами, что и в OwenProtocol (packPing), поэтому обмен по сети полностью
+    совпадает с синхронным вариантом. Ответы принимаются потоковым разборщиком (OwenFrameParser) и выбираются
+    по адресу и свертке, а перед запросом принятые байты отбрасываются: ответ, опоздавший после таймаута,
+    не приписывается следующему запросу.
+    Attributes:
+        reader  -- asyncio.StreamReader порта
+        writer  -- asyncio.StreamWriter порта
+        timeout -- время ожидания ответа (с)
+    """
+    def __init__(self, reader, writer, address, addrLen=8, timeout=1):
+        super().__init__(None, address, addrLen)
+        self.reader = reader
+        self.writer = writer
+        self.timeout = timeout
+        self.mutex = None  # asyncio.Lock создается в работающем цикле событий при первом обмене
+        self.parser = OwenFrameParser(self)
+
+    @classmethod
+    async def openSerial(cls, port, baudrate, address, addrLen=8, timeout=1, **kwargs):
+        """Открывает последовательный порт через pyserial-asyncio и создает экземпляр класса"""
+        if serial_asyncio is None:
+            raise OwenProtocolError('OwenProtocolError: pyserial-asyncio is not installed!')
+        reader, writer = await serial_asyncio.open_serial_connection(url=port, baudrate=baudrate, **kwargs)
+        return cls(reader, writer, address, addrLen, timeout)
+
+    def close(self):
+        self.writer.close()
+
+    async def getPingPong(self, address, name, request=True, data=b''):  # отправка фрейма запроса, получение ответа
+        hash = self.name2hash(name)
+        async with self.lock():  # блокируем порт для других задач
+            return await self.pingPong(hash, address, name, request, data)
+
+    async def getPingPongByHash(self, hash, address, name, request=True, data=b''):  # getPingPong с заранее вычисленной сверткой
+        async with self.lock():
+            return await self.pingPong(hash, address, name, request, data)
+
+    def useFrameParser(self, enable=True):  # ответы всегда принимаются потоковым разборщиком
+        if not enable:
+            raise OwenProtocolError('OwenProtocolError: AsyncOwenProtocol always uses the frame parser!')
+
+    def lock(self):  # asyncio.Lock создается в работающем цикле событий
+        if self.mutex is None:
+            self.mutex = asyncio.Lock()
+        return self.mutex
+
+    async def pingPong(self, hash, address, name, request=True, data=b''):  # обмен с прибором, блокировка должна быть захвачена
+        if self.retries or self.breaker is not None:
+            return await self.pingPongGuarded(hash, address, name, request, data)
+        return await self.pingPongOnce(hash, address, name, request, data)
+
+    async def pingPongGuarded(self, hash, address, name, request=True, data=b''):  # см. OwenProtocol.pingPongGuarded
+        breaker = self.breaker
+        if breaker is not None and not breaker.allow(address):
+            raise OwenCircuitOpenError('OwenProtocolError: Address {} is out of rotation after repeated failures!'.format(address),
+                                       address, breaker.retryTime(address))
+        attempt = 0
+        while True:
+            try:
+                dataRet = await self.pingPongOnce(hash, address, name, request, data)
+                break
+            except OwenTimeoutError:  # нет ответа: повтор только занял бы шину еще на один таймаут
+                if breaker is not None:
+                    breaker.failure(address)
+                raise
+            except OwenProtocolError:  # искаженный ответ (CRC, свертка): повтор
+                if attempt < self.retries:
+                    attempt += 1
+                    self.DebugMessage('Retry {} of {} for address {} ({})'.format(attempt, self.retries, address, name))
+                    continue
+                if breaker is not None:
+                    breaker.failure(address)
+                raise
+        if breaker is not None:
+            breaker.success(address)
+        return dataRet
+
+    async def pingPongOnce(self, hash, address, name, request=True, data=b''):  # один обмен с прибором
+        stats = self.stats
+        timeouts = self.timeouts
+        timeout = self.timeout if timeouts is None else timeouts.timeout(address)
+        try:
+            t0 = perf_counter()
+            rawRequest = self.packPing(hash, address, name, request, data)
+            t1 = perf_counter()
+            await self.discardInput()
+            self.writer.write(rawRequest)
+            await self.writer.drain()
+            t2 = perf_counter()
+            firstByte = []
+            try:
+                dataRet = await asyncio.wait_for(self.readPong(hash, address, name, firstByte), timeout)
+            except asyncio.TimeoutError:
+                raise OwenTimeoutError('OwenProtocolError: No response from address {} for {} is received from serial port!'.format(address, name))
+            t4 = perf_counter()  # разбор выполняется по мере приема, время разбора входит в чтение
+            t3 = firstByte[0] if firstByte else t4
+            if stats is not None:
+                stats.record(address, name, (t1 - t0, t2 - t1, t3 - t2, t4 - t3, 0.0, t4 - t0))
+            if timeouts is not None:
+                timeouts.update(address, t4 - t2)
+        except Exception as e:
+            if stats is not None:
+                stats.recordError(address, name, e)
+            if timeouts is not None and isinstance(e, OwenTimeoutError):
+                timeouts.expired(address)
+            raise
+        return dataRet
+
+    async def discardInput(self):  # отбрасывание принятых, но не прочитанных байтов (аналог reset_input_buffer)
+        """Только открытые методы StreamReader: чтение при наличии принятых байтов завершается за один проход
+        цикла событий, иначе отменяется (отмена ожидающего чтения не теряет данные)"""
+        self.parser.reset()
+        while True:
+            task = asyncio.ensure_future(self.reader.read(4096))
+            await asyncio.sleep(0)
+            if not task.done():
+                task.cancel()
+                await asyncio.wait((task,))
+                if task.cancelled():
+                    return
+            chunk = task.result()
+            if not chunk:
+                return  # соединение закрыто
+            self.parser.garbage += len(chunk)
+
+    async def readPong(self, hash, address, name, firstByte=None):  # чтение ответа через потоковый разборщик, возвращает данные
+        """firstByte - список, в который добавляется время получения первых байтов (для статистики)"""
+        address &= 0xFF if self._addrLen == 8 else 0x7FF
+        while True:
+            chunk = await self.reader.read(256)
+            if not chunk:
+                raise OwenProtocolError('OwenProtocolError: Connection is closed!')
+            if firstByte is not None and not firstByte:
+                firstByte.append(perf_counter())
+            for frame in self.parser.feed(chunk):
+                if not frame.request and frame.hash == hash and frame.address == address:
+                    if self.Debug:
+                        self.DebugMessage('Reading::data: {0}'.format(list(frame.data)))
+                    return frame.data
+
+    async def readMany(self, items, address=None, stopOnTimeout=False):
+        """Чтение нескольких параметров за один захват порта, см. OwenProtocol.readMany"""
+        if address is None:
+            address = self.address
+        requests = [(name, self.name2hash(name), type if callable(type) else getattr(self, 'unpack' + type)) for name, type in items]
+        values = {}
+        errors = {}
+        async with self.lock():
+            for name, hash, decoder in requests:
+                try:
+                    values[name] = decoder(await self.pingPong(hash, address, name))
+                except OwenError as e:
+                    errors[name] = e
+                    if stopOnTimeout and isinstance(e, OwenTimeoutError):
+                        break
+        return values, errors
+
+    async def getIndexed(self, name, index, type='Float24', address=None):  # см. OwenProtocol.getIndexed
+        if address is None:
+            address = self.address
+        data = await self.getPingPong(address, name, True, UINT16.pack(index))
+        return self.decodeIndexed(data, getattr(self, 'unpack' + type), index)
+
+    async def writeIndexed(self, name, index, value, type='Float24', address=None):  # запись индексированного параметра
+        if address is None:
+            address = self.address
+        data = self.appendIndexAndTime(getattr(self, 'pack' + type)(value), index)
+        data = await self.getPingPong(address, name, False, data)
+        return self.decodeIndexed(data, getattr(self, 'unpack' + type), index)
+
+    async def readChannels(self, name, indices, type='Float24', address=None):
+        """Чтение индексированного параметра по списку индексов за один захват порта, см. OwenProtocol.readChannels"""
+        if address is None:
+            address = self.address
+        hash = self.name2hash(name)
+        decoder = getattr(self, 'unpack' + type)
+        values = array('d', bytes(8 * len(indices)))
+        errors = {}
+        async with self.lock():
+            for i, index in enumerate(indices):
+                try:
+                    values[i] = self.decodeIndexed(await self.pingPong(hash, address, name, True, UINT16.pack(index)), decoder, index)
+                except OwenError as e:
+                    values[i] = float('nan')
+                    errors[index] = e
+        return values, errors
+
+    def enableAdaptiveTimeouts(self, enable=True, baudRate=115200, **kwargs):
+        """Адаптивные таймауты ответа по адресам, maxTimeout по умолчанию - timeout экземпляра"""
+        kwargs.setdefault('maxTimeout', self.timeout)
+        return super().enableAdaptiveTimeouts(enable, baudRate, **kwargs)
+
+    async def getInt16(self, name, address=None):  # возвращает целочисленный параметр
+        if address is None:
+            address = self.address
+        data = await self.getPingPong(address, name)
+        return self.unpackInt16(data)
+
+    async def getChar(self, name, address=None):  # возвращает байт со знаком
+        if address is None:
+            address = self.address
+        data = await self.getPingPong(address, name)
+        return self.unpackChar(data)
+
+    async def getIEEE32(self, name, address=None, withTime=False, withIndex=False):
+        if address is None:
+            address = self.address
+        data = await self.getPingPong(address, name)
+        return self.unpackIEEE32(data, withTime, withIndex)
+
+    async def getFloat24(self, name, address=None):
+        if address is None:
+            address = self.address
+        data = await self.getPingPong(address, name)
+        return self.unpackFloat24(data)
+
+    async def getString(self, name, address=None):  # возвращает строку
+        if address is None:
+            address = self.address
+        data = await self.getPingPong(address, name)
+        return self.unpackString(data)
+
+    async def writeFloat24(self, name, value, address=None):
+        data = self.packFloat24(value)
+        if address is None:
+            address = self.address
+        data = await self.getPingPong(address, name, request=False, data=data)
+        return self.unpackFloat24(data)
+
+    async def writeChar(self, name, value, address=None):
+        data = self.packChar(value)
+        if address is None:
+            address = self.address
+        data = await self.getPingPong(address, name, request=False, data=data)
+        return self.unpackChar(data)
+
+
+class AsyncOwenDevice(AsyncOwenProtocol):
+    networkSettingsNames = OwenDevice.networkSettingsNames
+    baudRates = OwenDevice.baudRates
+    formatNetworkSettings = OwenDevice.formatNetworkSettings
+    seedTimeout = OwenDevice.seedTimeout
+
+    async def getDeviceName(self, address=None):  # возвращает имя устройства
+        return (await self.getString('dev', address)).decode('cp1251')
+
+    async def getFirmwareVersion(self, address=None):  # возвращает версию прошивки
+        return (await self.getString('ver', address)).decode('cp1251')
+
+    async def getNetworkSettings(self, address=None):  # возвращает сетевые параметры прибора
+        values, errors = await self.readMany([(name, 'Int16') for name in self.networkSettingsNames], address, True)
+        if errors:
+            raise next(iter(errors.values()))
+        values = [values[name] for name in self.networkSettingsNames]
+        self.seedTimeout(address, values)
+        return self.formatNetworkSettings(values)
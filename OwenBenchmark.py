@@ -0,0 +1,162 @@
+"""Тесты производительности кодека и обмена OwenProtocol.
+
+Запуск:
+    python OwenBenchmark.py --output result.json                        # замер и сохранение результатов
+    python OwenBenchmark.py --baseline base.json --tolerance 10         # сравнение с эталоном (код возврата 1 при замедлении)
+"""
+import argparse
+import json
+import platform
+import sys
+from time import perf_counter
+import Owen
+from OwenSimulator import OwenSimulator, OwenSimulatorPort
+
+def timerOverhead(count=10000):  # время пары вызовов perf_counter (с), вычитается из времени отдельных вызовов
+    samples = []
+    for i in range(count):
+        start = perf_counter()
+        samples.append(perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+def measure(func, number=1000, repeat=30, overhead=None):
+    """Замер функции без аргументов. Пропускная способность и медиана/минимум среднего времени вызова (мкс)
+    считаются по repeat сериям из number вызовов, процентили p50/p90/p99 (мкс) - по времени number отдельных
+    вызовов за вычетом времени вызова таймера"""
+    if overhead is None:
+        overhead = timerOverhead()
+    func()  # прогрев (кэши, ленивые инициализации)
+    samples = []
+    for i in range(repeat):
+        start = perf_counter()
+        for j in range(number):
+            func()
+        samples.append((perf_counter() - start) / number)
+    samples.sort()
+    calls = []
+    for j in range(number):
+        start = perf_counter()
+        func()
+        calls.append(perf_counter() - start)
+    calls.sort()
+    def percentile(p):
+        return max(0.0, calls[min(len(calls) - 1, int(p / 100 * len(calls)))] - overhead) * 1e6
+    return {'opsPerSec': len(samples) / sum(samples), 'batchMedian': samples[len(samples) // 2] * 1e6,
+            'batchMin': samples[0] * 1e6, 'p50': percentile(50), 'p90': percentile(90), 'p99': percentile(99),
+            'number': number, 'repeat': repeat}
+
+def batchMedian(result):  # медиана среднего времени вызова; в файлах прежнего формата хранилась в p50
+    return result.get('batchMedian', result['p50'])
+
+def makeBenchmarks():
+    """Список (имя, функция, количество вызовов в серии) для замера"""
+    owen = Owen.OwenDevice(None, 1)
+    hash = owen.name2hash('PV')
+    payload = owen.packFloat24(25.0)
+    owen.packFrame(hash, 1, False, payload)
+    frame = bytes(owen.frame)
+    owen.packRawFrame()
+    rawFrame = bytes(owen.rawFrame)
+    ieee32 = owen.packIEEE32(1.5)
+    int16 = owen.packInt16(1234)
+    char = owen.packChar(1)
+    string = b'102MPT'
+
+    def unpackRaw():
+        owen.unpackRawFrame(rawFrame)
+        owen.unpackFrame()
+
+    def packRaw():
+        owen.packFrame(hash, 1, False, payload)
+        owen.packRawFrame()
+
+    simulator = OwenSimulator(1)
+    simulator.setParam('rEAd', 'Float24', [20.0 + channel for channel in range(8)])  # показания 8 каналов
+    device = Owen.OwenDevice(OwenSimulatorPort(simulator, timeout=1), 1)
+    parserDevice = Owen.OwenDevice(OwenSimulatorPort(simulator, timeout=1), 1)
+    parserDevice.useFrameParser()
+    statsDevice = Owen.OwenDevice(OwenSimulatorPort(simulator, timeout=1), 1)
+    statsDevice.enableStats()
+    networkSettings = [(name, 'Int16') for name in device.networkSettingsNames]
+
+    return [
+        ('owenCRC16', lambda: owen.owenCRC16(frame), 10000),
+        ('owenHASH', lambda: owen.owenHASH(b'\x42\x4e\x4e\x4e'), 10000),
+        ('name2hash', lambda: owen.name2hash('PV'), 10000),
+        ('calcNameHash', lambda: owen.calcNameHash('r.oUt'), 10000),
+        ('packFrame+packRawFrame', packRaw, 10000),
+        ('packRequest', lambda: owen.packRequest(hash, 1), 10000),
+        ('unpackRawFrame+unpackFrame', unpackRaw, 10000),
+        ('unpackFloat24', lambda: owen.unpackFloat24(payload), 10000),
+        ('unpackIEEE32', lambda: owen.unpackIEEE32(ieee32), 10000),
+        ('unpackInt16', lambda: owen.unpackInt16(int16), 10000),
+        ('unpackUnsignedInt16', lambda: owen.unpackUnsignedInt16(int16), 10000),
+        ('unpackChar', lambda: owen.unpackChar(char), 10000),
+        ('unpackString', lambda: owen.unpackString(string), 10000),
+        ('getPingPong', lambda: device.getPingPong(1, 'PV'), 1000),
+        ('getPingPong(parser)', lambda: parserDevice.getPingPong(1, 'PV'), 1000),
+        ('getPingPong(stats)', lambda: statsDevice.getPingPong(1, 'PV'), 1000),
+        ('writeFloat24', lambda: device.writeFloat24('SP', 30.0), 1000),
+        ('readMany(networkSettings)', lambda: device.readMany(networkSettings), 100),
+        ('readChannels(8)', lambda: device.readChannels('rEAd', range(8)), 100),
+    ]
+
+def run(names=None, repeat=30, scale=1.0):  # выполняет замеры, возвращает словарь результатов
+    results = {}
+    overhead = timerOverhead()
+    for name, func, number in makeBenchmarks():
+        if names and name not in names:
+            continue
+        results[name] = measure(func, max(1, int(number * scale)), repeat, overhead)
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'results': results}
+
+def compare(current, baseline, tolerance=10.0):
+    """Сравнение по медиане среднего времени вызова в сериях, возвращает список замедлившихся (имя, эталон, текущее, %)"""
+    regressions = []
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        change = (batchMedian(result) / batchMedian(base) - 1) * 100
+        if change > tolerance:
+            regressions.append((name, batchMedian(base), batchMedian(result), change))
+    return regressions
+
+def printResults(current, baseline=None):
+    print('{:<28} {:>12} {:>9} {:>9} {:>9} {:>9} {:>9}'.format(
+        'benchmark', 'ops/s', 'batch us', 'p50 us', 'p90 us', 'p99 us', 'vs base'))
+    for name, r in current['results'].items():
+        base = baseline['results'].get(name) if baseline else None
+        change = '{:+.1f}%'.format((batchMedian(r) / batchMedian(base) - 1) * 100) if base else ''
+        print('{:<28} {:>12.0f} {:>9.2f} {:>9.2f} {:>9.2f} {:>9.2f} {:>9}'.format(
+            name, r['opsPerSec'], batchMedian(r), r['p50'], r['p90'], r['p99'], change))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='OwenProtocol benchmarks')
+    parser.add_argument('--output', help='файл JSON для сохранения результатов')
+    parser.add_argument('--baseline', help='файл JSON с эталонными результатами для сравнения')
+    parser.add_argument('--tolerance', type=float, default=10.0, help='допустимое замедление медианы среднего времени вызова, %%')
+    parser.add_argument('--repeat', type=int, default=30, help='количество серий')
+    parser.add_argument('--scale', type=float, default=1.0, help='множитель количества вызовов в серии')
+    parser.add_argument('names', nargs='*', help='выполнить только указанные замеры')
+    args = parser.parse_args(argv)
+
+    current = run(args.names, args.repeat, args.scale)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    printResults(current, baseline)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(current, f, indent=2)
+    if baseline:
+        regressions = compare(current, baseline, args.tolerance)
+        for name, base, value, change in regressions:
+            print('REGRESSION {}: {:.2f} us -> {:.2f} us ({:+.1f}%)'.format(name, base, value, change))
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
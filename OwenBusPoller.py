@@ -0,0 +1,251 @@
+import heapq
+from queue import Queue
+from threading import Thread, Event, Lock
+from time import monotonic as time
+from Owen import OwenError, OwenCircuitOpenError
+from OwenHistory import OwenHistory
+
+class OwenPollEntry:  # Параметр опроса: адрес, имя, тип, требуемый период и статистика
+    def __init__(self, address, name, type, period, decoder):
+        self.address = address
+        self.name = name
+        self.hash = None  # свертка имени
+        self.type = type  # тип данных, по имени метода распаковки: 'Float24' -> unpackFloat24
+        self.period = period  # требуемый период опроса (с), 0 - опрашивать так часто, как возможно
+        self.decoder = decoder  # метод распаковки данных
+        self.nextTime = 0.0  # время следующего опроса
+        self.value = None  # последнее прочитанное значение
+        self.timestamp = None  # время получения последнего значения
+        self.error = None  # последняя ошибка (None при удачном чтении)
+        self.count = 0  # количество удачных чтений
+        self.errors = 0  # количество ошибок
+        self.startTime = None  # время первого опроса
+        self.subscriptions = []  # подписки на изменение значения (OwenSubscription)
+        self.history = None  # кольцевой буфер значений (OwenHistoryBuffer)
+
+    def requestedRate(self):  # требуемая частота опроса (Гц)
+        return 1 / self.period if self.period > 0 else float('inf')
+
+    def achievedRate(self, now=None):  # достигнутая частота опроса (Гц)
+        if self.startTime is None:
+            return 0.0
+        elapsed = (time() if now is None else now) - self.startTime
+        return (self.count + self.errors) / elapsed if elapsed > 0 else 0.0
+
+
+class OwenSubscription:  # Подписка на значимое изменение параметра опроса
+    """Attributes:
+        entry       -- параметр опроса (OwenPollEntry)
+        callback    -- функция callback(address, name, value, timestamp), вызывается в потоке рассылки
+        deadband    -- минимальное изменение значения относительно последнего переданного
+        minInterval -- минимальный интервал между вызовами callback (с)
+        value       -- последнее переданное значение
+        time        -- время последней передачи
+    """
+    def __init__(self, entry, callback, deadband=0, minInterval=0):
+        self.entry = entry
+        self.callback = callback
+        self.deadband = deadband
+        self.minInterval = minInterval
+        self.value = None
+        self.time = None
+        self.pending = None  # (значение, время получения), ожидающее вызова callback
+        self.queued = False  # подписка находится в очереди рассылки
+
+    def changed(self, value, now):  # значимое изменение относительно последнего переданного значения
+        if self.time is None:
+            return True
+        if now - self.time < self.minInterval:
+            return False  # изменение будет передано при следующем опросе после окончания интервала
+        try:
+            return abs(value - self.value) > self.deadband
+        except TypeError:  # строки, кортежи (значение, время, индекс)
+            return value != self.value
+
+
+class OwenBusPoller:  # Планировщик опроса нескольких приборов на одной шине RS-485
+    """Опрашивает список параметров (адрес, имя, тип, период) подряд, без пауз между запросами:
+    следующим выполняется запрос с ближайшим временем опроса. Пауза возникает только если
+    ни один параметр еще не должен опрашиваться (все периоды больше времени обмена).
+    Attributes:
+        owen          -- экземпляр OwenProtocol/OwenDevice, через который выполняется обмен
+        entries       -- список OwenPollEntry
+        defaultPeriod -- период опроса параметров, добавленных подпиской без указания периода (с)
+        onError       -- функция onError(subscription, exception) для ошибок обработчиков подписок,
+                         по умолчанию ошибка выводится через owen.DebugMessage
+    """
+    def __init__(self, owen, entries=()):
+        self.owen = owen
+        self.entries = []
+        self.entriesByKey = {}  # (адрес, имя) -> OwenPollEntry
+        self.heap = []  # очередь (время опроса, номер параметра)
+        self.mutex = Lock()
+        self.stopEvent = Event()
+        self.thread = None
+        self.dispatchQueue = Queue()  # подписки с новыми значениями для потока рассылки
+        self.dispatchThread = None
+        self.history = None  # OwenHistory (enableHistory)
+        self.recorder = None  # OwenRecorder: запись всех результатов опроса в двоичный файл
+        self.defaultPeriod = 1.0
+        self.onError = None
+        for entry in entries:
+            self.add(*entry)
+
+    def add(self, address, name, type, period=0):  # добавляет параметр опроса
+        decoder = getattr(self.owen, 'unpack' + type, None)
+        if decoder is None:
+            raise OwenError('OwenBusPoller: Unknown parameter type {}!'.format(type))
+        hash = self.owen.name2hash(name)  # проверка имени и заполнение кэша сверток
+        entry = OwenPollEntry(address, name, type, period, decoder)
+        entry.hash = hash
+        self.attachHistory(entry)
+        with self.mutex:
+            entry.nextTime = time()
+            heapq.heappush(self.heap, (entry.nextTime, len(self.entries)))
+            self.entries.append(entry)
+            self.entriesByKey[(address, name)] = entry
+        return entry
+
+    def pollOnce(self, block=True):
+        """Выполняет один запрос (ближайший по времени), возвращает OwenPollEntry или None, если опрашивать нечего"""
+        while True:
+            with self.mutex:
+                if not self.heap:
+                    return None
+                nextTime, index = self.heap[0]
+                delay = nextTime - time()
+                if delay <= 0:
+                    heapq.heappop(self.heap)
+                    break
+            if not block or self.stopEvent.wait(delay):  # ожидание прерывается вызовом stop()
+                return None
+        entry = self.entries[index]
+        now = time()
+        if entry.startTime is None:
+            entry.startTime = now
+        try:
+            data = self.owen.getPingPongByHash(entry.hash, entry.address, entry.name)
+            entry.value = entry.decoder(data)
+            entry.timestamp = time()
+            entry.error = None
+            entry.count += 1
+            if entry.history is not None:  # IEEE32 распаковывается в (значение, время, индекс)
+                entry.history.append(entry.value[0] if entry.type == 'IEEE32' else entry.value, entry.timestamp)
+            if self.recorder is not None and entry.type != 'String':
+                self.recorder.append(entry.address, entry.hash, entry.type,
+                                     entry.value[0] if entry.type == 'IEEE32' else entry.value)
+            if entry.subscriptions:
+                self.notify(entry)
+        except Exception as e:
+            entry.error = e
+            entry.errors += 1
+            if self.recorder is not None:
+                self.recorder.recordError(entry.address, entry.name, entry.type, e)
+        entry.nextTime = max(nextTime + entry.period, now)  # при отставании не пытаемся догнать пропущенные опросы
+        if isinstance(entry.error, OwenCircuitOpenError) and entry.error.retryTime is not None:
+            entry.nextTime = max(entry.nextTime, entry.error.retryTime)  # адрес исключен из обмена до пробного запроса
+        with self.mutex:
+            heapq.heappush(self.heap, (entry.nextTime, index))
+        return entry
+
+    def enableHistory(self, capacity=3600, typecode='f'):
+        """Запись истории значений опрашиваемых параметров (кроме строк) в кольцевые буферы емкостью capacity
+        значений (OwenHistory в атрибуте history). typecode 'f' - 4 байта на значение, 'd' - 8 байт"""
+        self.history = OwenHistory(capacity, typecode)
+        for entry in self.entries:
+            self.attachHistory(entry)
+        return self.history
+
+    def attachHistory(self, entry):
+        if self.history is not None and entry.type != 'String':
+            entry.history = self.history.buffer(entry.address, entry.name)
+
+    def subscribe(self, address, name, callback, deadband=0, minInterval=0, type=None, period=None):
+        """Подписка на изменение параметра: callback(address, name, value, timestamp) вызывается только если значение
+        изменилось больше чем на deadband и с последнего вызова прошло не меньше minInterval секунд.
+        Вызовы выполняются в отдельном потоке рассылки, поэтому медленный обработчик не задерживает опрос шины;
+        если обработчик не успевает, передается только последнее значение.
+        Параметр добавляется в опрос (add), если его еще нет, для этого нужен type; period по умолчанию -
+        defaultPeriod. Возвращает OwenSubscription"""
+        entry = self.entriesByKey.get((address, name))
+        if entry is None:
+            if type is None:
+                raise OwenError('OwenBusPoller: Parameter {} at address {} is not polled, type is required!'.format(name, address))
+            entry = self.add(address, name, type, self.defaultPeriod if period is None else period)
+        subscription = OwenSubscription(entry, callback, deadband, minInterval)
+        with self.mutex:
+            entry.subscriptions = entry.subscriptions + [subscription]  # список заменяется, а не изменяется (чтение без блокировки)
+            if self.dispatchThread is None:
+                self.dispatchThread = Thread(target=self.dispatch, daemon=True)
+                self.dispatchThread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        entry = subscription.entry
+        with self.mutex:
+            entry.subscriptions = [s for s in entry.subscriptions if s is not subscription]
+
+    def notify(self, entry):  # постановка значимых изменений в очередь рассылки (в потоке опроса)
+        value = entry.value
+        now = entry.timestamp
+        for subscription in entry.subscriptions:
+            if subscription.changed(value, now):
+                subscription.value = value
+                subscription.time = now
+                with self.mutex:
+                    subscription.pending = (value, now)
+                    if subscription.queued:
+                        continue  # обработчик еще не получил предыдущее значение: оно заменяется новым
+                    subscription.queued = True
+                self.dispatchQueue.put(subscription)
+
+    def dispatch(self):  # поток рассылки: вызов обработчиков подписок
+        while True:
+            subscription = self.dispatchQueue.get()
+            with self.mutex:
+                value, timestamp = subscription.pending
+                subscription.queued = False
+            entry = subscription.entry
+            try:
+                subscription.callback(entry.address, entry.name, value, timestamp)
+            except Exception as e:  # ошибка обработчика не должна останавливать рассылку
+                self.reportError(subscription, e)
+
+    def reportError(self, subscription, error):  # ошибка обработчика подписки: onError или отладочное сообщение
+        if self.onError is not None:
+            try:
+                self.onError(subscription, error)
+                return
+            except Exception as e:  # ошибка самого onError выводится отладочным сообщением
+                error = e
+        entry = subscription.entry
+        self.owen.DebugMessage('OwenBusPoller: subscription callback error ({} at address {}): {!r}'.format(
+            entry.name, entry.address, error))
+
+    def run(self):  # цикл опроса до вызова stop()
+        while not self.stopEvent.is_set():
+            if self.pollOnce() is None and not self.heap:
+                self.stopEvent.wait(0.1)
+
+    def start(self):  # запуск опроса в отдельном потоке
+        self.stopEvent.clear()
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopEvent.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def rates(self):
+        """Требуемая и достигнутая частота опроса: список (адрес, имя, требуемая, достигнутая, ошибки)"""
+        now = time()
+        return [(e.address, e.name, e.requestedRate(), e.achievedRate(now), e.errors) for e in self.entries]
+
+    def table(self):
+        """Последние значения: словарь (адрес, имя) -> (значение, время получения, последняя ошибка)"""
+        return {(e.address, e.name): (e.value, e.timestamp, e.error) for e in self.entries}
+
+    def value(self, address, name):  # последнее значение параметра
+        return self.entriesByKey[(address, name)].value
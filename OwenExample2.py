@@ -4,6 +4,7 @@ from queue import Queue, Empty
 import time
 import os
 import Owen
+from OwenBusPoller import OwenBusPoller
 import serial
 
 from tkinter import *
@@ -15,7 +16,7 @@ OWEN_SPEED = 115200
 
 def OwenIODaemon():
     global owenDevError
-    global com, pv, rs, sp
+    global com
     queueLogMsg.put("OwenIO daemon запущен")
     while not stop_threads:
         try:
@@ -28,14 +29,12 @@ def OwenIODaemon():
                 queueLogMsg.put('Прошивка: {}'.format(owenDev.getFirmwareVersion()))
                 queueLogMsg.put(owenDev.getNetworkSettings())
 
-            rs = owenDev.getChar('r-S')
-            pidOnOffButtonState(rs)
-            pv = owenDev.getFloat24('PV')
-            sp = owenDev.getFloat24('SP')
-            if not spScale.lock:
-                spScale.set(sp)
-            queueLogMsg.put('SP = {:.2f} °C, PV = {:.2f} °C, PID = {}, lock = {}'.format(sp, pv, rs, spScale.lock))
-            time.sleep(1)
+            entry = poller.pollOnce()  # опрос по расписанию, обработчики подписок вызываются в отдельном потоке
+            if entry is not None and entry.error is not None:
+                if not isinstance(entry.error, Owen.OwenError):
+                    raise entry.error  # ошибка порта: переоткрытие
+                owenDevError = True  # ошибка обмена с прибором: остальные приборы на шине опрашиваются без паузы
+                queueLogMsg.put(entry.error)
         except Exception as e:
             owenDevError = True
             queueLogMsg.put(e)
@@ -45,6 +44,22 @@ def OwenIODaemon():
 
     print("OwenIO daemon остановлен")
 
+def onRS(address, name, value, timestamp):  # вызывается потоком рассылки OwenBusPoller только при изменении
+    global rs
+    rs = value
+    pidOnOffButtonState(rs)
+
+def onSP(address, name, value, timestamp):
+    global sp
+    sp = value
+    if not spScale.lock:
+        spScale.set(sp)
+
+def onPV(address, name, value, timestamp):
+    global pv
+    pv = value
+    queueLogMsg.put('SP = {:.2f} °C, PV = {:.2f} °C, PID = {}, lock = {}'.format(sp, pv, rs, spScale.lock))
+
 def writeToLog(msg):
     # https://tkdocs.com/tutorial/text.html#basics
     numlines = int(log.index('end - 1 line').split('.')[0])
@@ -103,6 +118,12 @@ Owen.OwenDevice.writeSP = writeSP   # регистрируем новый мет
 # Owen.OwenDevice.writeRS = classmethod(writeRS)
 
 owenDev = Owen.OwenDevice(com, 1)  # порт, адрес устройства
+owenDev.enableCircuitBreaker()  # повтор искаженных ответов, неотвечающий прибор опрашивается редкими пробными запросами
+owenDev.enableCache()  # имя прибора и версия читаются один раз за сеанс, сетевые параметры - не чаще раза в минуту
+poller = OwenBusPoller(owenDev)
+poller.subscribe(1, 'r-S', onRS, type='Char', period=1)
+poller.subscribe(1, 'SP', onSP, type='Float24', period=1)
+poller.subscribe(1, 'PV', onPV, deadband=0.1, minInterval=1, type='Float24', period=1)  # журнал только при изменении PV
 owenDevError = False
 sp = 0  # Уставка
 rs = False  # Вкл./выкл. PID
@@ -0,0 +1,112 @@
+from array import array
+try:
+    import numpy  # необязательная зависимость: представления буферов без копирования
+except ImportError:
+    numpy = None
+
+class OwenHistoryBuffer:  # Кольцевой буфер значений параметра фиксированной емкости
+    """Значения и время (monotonic) хранятся в array, а не в списках объектов float и кортежей:
+    4 байта на значение типа 'f' (Float24 - усеченный float32, поэтому хранится без потерь) и 8 байт на время.
+    Старые значения перезаписываются новыми. Буферы не изменяют размер, поэтому представления numpy
+    ссылаются на них без копирования.
+    Attributes:
+        capacity -- емкость (количество значений)
+        values   -- array значений (typecode 'f' или 'd')
+        times    -- array('d') времени получения значений
+        count    -- количество значений в буфере (не больше capacity)
+        head     -- индекс следующей записи
+    """
+    def __init__(self, capacity, typecode='f'):
+        if capacity <= 0:
+            raise ValueError('History capacity must be positive!')
+        self.capacity = capacity
+        self.values = array(typecode, bytes(array(typecode).itemsize * capacity))
+        self.times = array('d', bytes(8 * capacity))
+        self.count = 0
+        self.head = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, value, timestamp):
+        head = self.head
+        self.values[head] = value
+        self.times[head] = timestamp
+        self.head = head + 1 if head + 1 < self.capacity else 0
+        if self.count < self.capacity:
+            self.count += 1
+
+    def clear(self):
+        self.count = 0
+        self.head = 0
+
+    def last(self):  # последнее значение (время, значение) или None
+        if not self.count:
+            return None
+        i = self.head - 1 if self.head else self.capacity - 1
+        return self.times[i], self.values[i]
+
+    def ranges(self):  # интервалы индексов буфера в хронологическом порядке
+        if self.count < self.capacity:
+            return [(0, self.count)]
+        if self.head == 0:
+            return [(0, self.capacity)]
+        return [(self.head, self.capacity), (0, self.head)]
+
+    def segments(self):
+        """Список (времена, значения) в хронологическом порядке: один или два (после заполнения буфера) сегмента
+        в виде представлений numpy без копирования (memoryview, если numpy не установлен)"""
+        if numpy is not None:
+            times = numpy.frombuffer(self.times, dtype=numpy.float64)
+            values = numpy.frombuffer(self.values, dtype=numpy.float32 if self.values.typecode == 'f' else numpy.float64)
+        else:
+            times = memoryview(self.times)
+            values = memoryview(self.values)
+        return [(times[start:stop], values[start:stop]) for start, stop in self.ranges()]
+
+    def arrays(self):
+        """Массивы numpy (времена, значения) в хронологическом порядке. Без копирования, пока буфер не заполнен
+        или запись не дошла до его конца, иначе сегменты объединяются в новые массивы"""
+        if numpy is None:
+            raise ImportError('OwenHistoryBuffer.arrays requires numpy!')
+        segments = self.segments()
+        if len(segments) == 1:
+            return segments[0]
+        return numpy.concatenate([s[0] for s in segments]), numpy.concatenate([s[1] for s in segments])
+
+    def tolist(self):  # список (время, значение) в хронологическом порядке (копия)
+        result = []
+        for start, stop in self.ranges():
+            result.extend(zip(self.times[start:stop], self.values[start:stop]))
+        return result
+
+    def since(self, timestamp):  # значения не старше timestamp: список (время, значение)
+        return [item for item in self.tolist() if item[0] >= timestamp]
+
+    def stats(self):  # минимум, максимум и среднее значение или None
+        if not self.count:
+            return None
+        if numpy is not None:
+            values = numpy.concatenate([s[1] for s in self.segments()])
+            return float(values.min()), float(values.max()), float(values.mean())
+        values = self.values[:self.count]
+        return min(values), max(values), sum(values) / self.count
+
+
+class OwenHistory:  # Набор буферов истории по (адрес, имя)
+    def __init__(self, capacity=3600, typecode='f'):
+        self.capacity = capacity  # емкость по умолчанию
+        self.typecode = typecode
+        self.buffers = {}  # (адрес, имя) -> OwenHistoryBuffer
+
+    def buffer(self, address, name, capacity=None, typecode=None):  # буфер параметра, создается при первом обращении
+        buffer = self.buffers.get((address, name))
+        if buffer is None:
+            buffer = self.buffers[(address, name)] = OwenHistoryBuffer(capacity or self.capacity, typecode or self.typecode)
+        return buffer
+
+    def append(self, address, name, value, timestamp):
+        self.buffer(address, name).append(value, timestamp)
+
+    def memory(self):  # объем данных буферов (байт)
+        return sum(b.capacity * (b.values.itemsize + b.times.itemsize) for b in self.buffers.values())
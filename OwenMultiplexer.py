@@ -0,0 +1,117 @@
+from concurrent.futures import Future
+from queue import Queue
+from threading import Thread, Lock
+from Owen import OwenError
+
+class OwenTransaction:  # Обмен с прибором и ожидающие его результата Future
+    def __init__(self, address, name, hash, request, data):
+        self.address = address
+        self.name = name
+        self.hash = hash
+        self.request = request
+        self.data = data
+        self.waiters = []  # список (Future, функция распаковки)
+
+
+class OwenMultiplexer:  # Выполнение запросов нескольких потоков одним потоком-владельцем шины
+    """submit() ставит запрос в очередь и сразу возвращает concurrent.futures.Future. Обмен выполняет один поток,
+    поэтому вызывающие потоки не конкурируют за мьютекс протокола. Одновременные запросы чтения одного
+    параметра (адрес, свертка) объединяются: пока запрос ожидает выполнения или выполняется, новые запросы
+    получают результат того же обмена. Запросы записи не объединяются и выполняются в порядке поступления;
+    чтение, поставленное после записи параметра, не объединяется с чтением, поставленным до нее.
+    Attributes:
+        owen         -- экземпляр OwenProtocol/OwenDevice, через который выполняется обмен
+        transactions -- количество выполненных обменов
+        shared       -- количество запросов, получивших результат чужого обмена
+    """
+    def __init__(self, owen):
+        self.owen = owen
+        self.queue = Queue()
+        self.inflight = {}  # (адрес, свертка) -> OwenTransaction чтения, ожидающая или выполняемая
+        self.mutex = Lock()
+        self.transactions = 0
+        self.shared = 0
+        self.closed = False  # после close() новые запросы не принимаются
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, name, type='Float24', address=None, value=None):
+        """Запрос параметра name (value=None - чтение, иначе запись value), результат Future - значение,
+        распакованное методом 'unpack' + type, или исключение OwenError. После close() вызывает OwenError"""
+        owen = self.owen
+        if address is None:
+            address = owen.address
+        decoder = getattr(owen, 'unpack' + type)
+        hash = owen.name2hash(name)
+        future = Future()
+        if value is not None:
+            transaction = OwenTransaction(address, name, hash, False, getattr(owen, 'pack' + type)(value))
+            transaction.waiters.append((future, decoder))
+            with self.mutex:  # последующие чтения параметра выполняются после записи, а не объединяются с прежним чтением
+                self.checkOpen()
+                self.inflight.pop((address, hash), None)
+                self.queue.put(transaction)
+            return future
+        key = (address, hash)
+        with self.mutex:
+            self.checkOpen()
+            transaction = self.inflight.get(key)
+            if transaction is not None:
+                transaction.waiters.append((future, decoder))
+                self.shared += 1
+                return future
+            transaction = self.inflight[key] = OwenTransaction(address, name, hash, True, b'')
+            transaction.waiters.append((future, decoder))
+            self.queue.put(transaction)  # под мьютексом: запрос не может оказаться в очереди после завершения потока
+        return future
+
+    def checkOpen(self):  # вызывается под мьютексом
+        if self.closed:
+            raise OwenError('OwenMultiplexer: Multiplexer is closed!')
+
+    def read(self, name, type='Float24', address=None, timeout=None):  # синхронное чтение через submit
+        return self.submit(name, type, address).result(timeout)
+
+    def write(self, name, value, type='Float24', address=None, timeout=None):  # синхронная запись через submit
+        return self.submit(name, type, address, value).result(timeout)
+
+    def run(self):  # поток-владелец шины
+        owen = self.owen
+        while True:
+            transaction = self.queue.get()
+            if transaction is None:
+                return
+            try:
+                owen.mutex.acquire()  # прямые вызовы getPingPong из других потоков по-прежнему допустимы
+                try:
+                    data = owen.pingPong(transaction.hash, transaction.address, transaction.name,
+                                         transaction.request, transaction.data)
+                finally:
+                    owen.mutex.release()
+                error = None
+            except Exception as e:
+                data = None
+                error = e
+            self.transactions += 1
+            with self.mutex:  # после этого новые запросы чтения параметра вызывают новый обмен
+                key = (transaction.address, transaction.hash)
+                if transaction.request and self.inflight.get(key) is transaction:
+                    del self.inflight[key]
+                waiters = transaction.waiters
+            for future, decoder in waiters:
+                if not future.set_running_or_notify_cancel():
+                    continue  # запрос отменен вызывающим потоком
+                if error is not None:
+                    future.set_exception(error)
+                    continue
+                try:
+                    future.set_result(decoder(data))
+                except OwenError as e:
+                    future.set_exception(e)
+
+    def close(self):  # завершение потока после выполнения поставленных запросов
+        with self.mutex:
+            if not self.closed:
+                self.closed = True
+                self.queue.put(None)
+        self.thread.join()
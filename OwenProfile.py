@@ -0,0 +1,180 @@
+import inspect
+import json
+import os
+from functools import partial
+from Owen import OwenProtocol, OwenError
+try:
+    import tomllib  # Python 3.11+
+except ImportError:
+    try:
+        import tomli as tomllib  # необязательная зависимость для профилей TOML на Python < 3.11
+    except ImportError:
+        tomllib = None
+
+codec = OwenProtocol(None, 0)  # вычисление сверток имен при компиляции профилей
+
+class OwenProfileError(OwenError):
+    """Исключение вызвано ошибкой в описании профиля прибора
+    Attributes:
+        msg  -- текст ошибки
+    """
+    def __init__(self, msg):
+        self.msg = msg
+    def __str__(self):
+       return repr(self.msg)
+
+class OwenParameter:  # Скомпилированное описание параметра: свертка, длина ответа, методы распаковки и упаковки
+    """Attributes:
+        name      -- имя параметра в приборе ('r-S')
+        attr      -- имя атрибута в классе прибора ('r_S')
+        hash      -- свертка имени
+        type      -- тип данных ('Float24', 'IEEE32', 'Int16', 'UnsignedInt16', 'Char', 'UnsignedChar', 'String')
+        withTime  -- ответ содержит время (только IEEE32)
+        withIndex -- ответ содержит индекс (только IEEE32)
+        scale     -- множитель значения (значение = данные * scale + offset)
+        offset    -- смещение значения
+        writable  -- параметр доступен для записи
+        dataSize  -- ожидаемая длина данных ответа (None - переменная)
+    """
+    dataSizes = {'Float24': 3, 'IEEE32': 4, 'Char': 1, 'UnsignedChar': 1, 'Int16': None, 'UnsignedInt16': None, 'String': None}
+
+    def __init__(self, name, type, attr=None, withTime=False, withIndex=False, scale=1, offset=0, writable=False,
+                 size=None, description=''):
+        if type not in self.dataSizes:
+            raise OwenProfileError('OwenProfileError: Unknown type {} of parameter {}!'.format(type, name))
+        if (withTime or withIndex) and type != 'IEEE32':
+            raise OwenProfileError('OwenProfileError: Time and index are supported only for IEEE32 ({})!'.format(name))
+        self.name = name
+        self.attr = attr or name.replace('-', '_').replace('.', '_').replace('/', '_')
+        self.hash = codec.name2hash(name)
+        self.type = type
+        self.withTime = withTime
+        self.withIndex = withIndex
+        self.scale = scale
+        self.offset = offset
+        self.writable = writable
+        self.description = description
+        self.dataSize = size if size is not None else self.dataSizes[type]
+        if self.dataSize is not None and type == 'IEEE32':
+            self.dataSize += 2 * bool(withTime) + 2 * bool(withIndex)
+        self.decode = self.compileDecoder()
+        self.encode = self.compileEncoder()
+
+    def compileDecoder(self):  # функция (owen, data) -> значение
+        unpack = getattr(OwenProtocol, 'unpack' + self.type)
+        scale, offset = self.scale, self.offset
+        scaled = scale != 1 or offset != 0
+        if self.type == 'IEEE32':
+            withTime, withIndex = self.withTime, self.withIndex
+            if withTime or withIndex:
+                if scaled:
+                    def decode(owen, data):
+                        value, time, index = unpack(owen, data, withTime, withIndex)
+                        return value * scale + offset, time, index
+                    return decode
+                return lambda owen, data: unpack(owen, data, withTime, withIndex)
+            if scaled:
+                return lambda owen, data: unpack(owen, data)[0] * scale + offset
+            return lambda owen, data: unpack(owen, data)[0]
+        if scaled:
+            return lambda owen, data: unpack(owen, data) * scale + offset
+        return unpack
+
+    def compileEncoder(self):  # функция (owen, значение) -> данные
+        pack = getattr(OwenProtocol, 'pack' + self.type, None)
+        if pack is None:
+            return None
+        scale, offset = self.scale, self.offset
+        if self.type in ('Char', 'Int16'):
+            return lambda owen, value: pack(owen, int(round((value - offset) / scale)))
+        if scale != 1 or offset != 0:
+            return lambda owen, value: pack(owen, (value - offset) / scale)
+        return pack
+
+    def read(self, owen, address):  # для AsyncOwenProtocol возвращает сопрограмму
+        return self.decodeResult(owen, owen.getPingPongByHash(self.hash, address, self.name))
+
+    def write(self, owen, address, value):
+        if not self.writable or self.encode is None:
+            raise OwenProfileError('OwenProfileError: Parameter {} is not writable!'.format(self.name))
+        data = owen.getPingPongByHash(self.hash, address, self.name, False, self.encode(owen, value))
+        return self.decodeResult(owen, data)
+
+    def decodeResult(self, owen, data):  # распаковка данных ответа или ожидаемого ответа асинхронного протокола
+        if inspect.isawaitable(data):
+            async def decode():
+                return self.decode(owen, await data)
+            return decode()
+        return self.decode(owen, data)
+
+
+class OwenProfile:  # Профиль модели прибора: список параметров и сгенерированный класс прибора
+    def __init__(self, model, parameters, description=''):
+        self.model = model
+        self.description = description
+        self.parameters = {}  # имя -> OwenParameter
+        for parameter in parameters:
+            if not isinstance(parameter, OwenParameter):
+                parameter = OwenParameter(**parameter)
+            self.parameters[parameter.name] = parameter
+        self.deviceClass = self.compileDeviceClass()
+
+    def compileDeviceClass(self):  # класс прибора со свойствами для каждого параметра
+        attributes = {'profile': self}
+        for parameter in self.parameters.values():
+            if hasattr(OwenProfileDevice, parameter.attr) or parameter.attr in attributes:
+                raise OwenProfileError('OwenProfileError: Attribute name {} of parameter {} is reserved or duplicated!'.format(
+                    parameter.attr, parameter.name))
+            getter = lambda self, parameter=parameter: parameter.read(self.owen, self.address)
+            setter = None
+            if parameter.writable:
+                setter = lambda self, value, parameter=parameter: parameter.write(self.owen, self.address, value)
+            attributes[parameter.attr] = property(getter, setter, doc=parameter.description)
+        className = 'Owen' + ''.join(ch for ch in self.model if ch.isalnum()) + 'Device'
+        return type(className, (OwenProfileDevice,), attributes)
+
+    def device(self, owen, address=None):  # экземпляр прибора на протоколе owen
+        return self.deviceClass(owen, address)
+
+    @classmethod
+    def fromDict(cls, data):
+        parameters = data.get('parameters', [])
+        if isinstance(parameters, dict):  # допускается словарь имя -> описание (удобно в TOML)
+            parameters = [dict(description, name=name) for name, description in parameters.items()]
+        return cls(data.get('model', 'Unknown'), parameters, data.get('description', ''))
+
+
+def loadProfile(path):
+    """Загрузка профиля прибора из файла JSON или TOML (по расширению)"""
+    if os.path.splitext(path)[1].lower() == '.toml':
+        if tomllib is None:
+            raise OwenProfileError('OwenProfileError: TOML profiles require Python 3.11+ or tomli package!')
+        with open(path, 'rb') as f:
+            return OwenProfile.fromDict(tomllib.load(f))
+    with open(path, encoding='utf-8') as f:
+        return OwenProfile.fromDict(json.load(f))
+
+
+class OwenProfileDevice:  # Базовый класс приборов, сгенерированных по профилю (OwenProfile.deviceClass)
+    """Параметры профиля доступны как свойства: dev.PV, dev.SP = 30.0, dev.r_S.
+    Attributes:
+        owen    -- экземпляр OwenProtocol/OwenDevice, через который выполняется обмен
+        address -- адрес прибора
+    """
+    profile = None
+
+    def __init__(self, owen, address=None):
+        self.owen = owen
+        self.address = owen.address if address is None else address
+
+    def read(self, name):  # чтение параметра по имени
+        return self.profile.parameters[name].read(self.owen, self.address)
+
+    def write(self, name, value):  # запись параметра по имени
+        return self.profile.parameters[name].write(self.owen, self.address, value)
+
+    def readAll(self, names=None):
+        """Чтение параметров профиля за один захват шины, возвращает (значения, ошибки) как OwenProtocol.readMany"""
+        parameters = self.profile.parameters
+        parameters = parameters.values() if names is None else [parameters[name] for name in names]
+        return self.owen.readMany([(p.name, partial(p.decode, self.owen)) for p in parameters], self.address)
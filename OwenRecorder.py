@@ -0,0 +1,187 @@
+"""Запись результатов опроса в двоичный файл с отображением в память (mmap) и чтение с фильтрацией.
+
+Формат файла: заголовок HEADER_SIZE байт (сигнатура, версия, размер записи, количество записей),
+далее записи фиксированного размера RECORD (little-endian):
+    время (Unix, float64), адрес (uint16), свертка имени (uint16), тип (uint8), состояние (uint8), значение (float64)
+Файл увеличивается сегментами по segmentRecords записей, при закрытии обрезается до записанных данных.
+"""
+import mmap
+import os
+import struct
+from collections import namedtuple
+from threading import Lock
+from time import time
+from Owen import OwenProtocol, OwenTimeoutError
+try:
+    import numpy  # необязательная зависимость: быстрый просмотр и фильтрация без разбора записей по одной
+except ImportError:
+    numpy = None
+
+MAGIC = b'OWENREC\x00'
+VERSION = 1
+HEADER = struct.Struct('<8sHHIQ')  # сигнатура, версия, размер записи, резерв, количество записей
+HEADER_SIZE = 64
+COUNT_OFFSET = 16  # смещение количества записей в заголовке
+COUNT = struct.Struct('<Q')
+RECORD = struct.Struct('<dHHBB2xd')  # время, адрес, свертка, тип, состояние, (выравнивание), значение
+
+TYPE_TAGS = {'Float24': 1, 'IEEE32': 2, 'Int16': 3, 'UnsignedInt16': 4, 'Char': 5, 'UnsignedChar': 6}
+TYPE_NAMES = {tag: name for name, tag in TYPE_TAGS.items()}
+STATUS_OK = 0  # значение прочитано
+STATUS_TIMEOUT = 1  # нет ответа
+STATUS_ERROR = 2  # другая ошибка обмена или распаковки
+
+if numpy is not None:
+    RECORD_DTYPE = numpy.dtype([('time', '<f8'), ('address', '<u2'), ('hash', '<u2'), ('type', 'u1'),
+                                ('status', 'u1'), ('pad', 'V2'), ('value', '<f8')])
+
+OwenRecord = namedtuple('OwenRecord', 'time address hash type status value')
+
+codec = OwenProtocol(None, 0)  # вычисление сверток имен для фильтров
+
+
+class OwenRecorder:  # Запись результатов опроса в файл фиксированными записями через mmap
+    """Attributes:
+        path           -- имя файла
+        segmentRecords -- количество записей, на которое увеличивается файл
+        count          -- количество записей в файле
+        capacity       -- количество записей, для которых выделено место
+    """
+    def __init__(self, path, segmentRecords=65536):
+        self.path = path
+        self.segmentRecords = segmentRecords
+        self.mutex = Lock()
+        exists = os.path.exists(path) and os.path.getsize(path) >= HEADER_SIZE
+        self.file = open(path, 'r+b' if exists else 'w+b')
+        if exists:  # дописывание в существующий файл
+            magic, version, recordSize, reserved, count = HEADER.unpack(self.file.read(HEADER.size))
+            if magic != MAGIC or recordSize != RECORD.size:
+                self.file.close()
+                raise ValueError('{} is not an Owen record file!'.format(path))
+            self.count = min(count, (os.path.getsize(path) - HEADER_SIZE) // RECORD.size)
+        else:
+            self.file.write(HEADER.pack(MAGIC, VERSION, RECORD.size, 0, 0).ljust(HEADER_SIZE, b'\x00'))
+            self.count = 0
+        self.capacity = 0
+        self.map = None
+        self.grow(self.count)
+
+    def grow(self, minCapacity):  # увеличение файла до целого числа сегментов, не меньше minCapacity записей
+        segments = minCapacity // self.segmentRecords + 1
+        self.capacity = segments * self.segmentRecords
+        if self.map is not None:
+            self.map.close()
+        self.file.truncate(HEADER_SIZE + self.capacity * RECORD.size)
+        self.map = mmap.mmap(self.file.fileno(), HEADER_SIZE + self.capacity * RECORD.size)
+
+    def append(self, address, hash, type, value, status=STATUS_OK, timestamp=None):
+        """Добавляет запись. type - имя типа ('Float24'), value - число (None - NaN)"""
+        if value is None:
+            value = float('nan')
+        with self.mutex:
+            if self.count >= self.capacity:
+                self.grow(self.count)
+            RECORD.pack_into(self.map, HEADER_SIZE + self.count * RECORD.size, time() if timestamp is None else timestamp,
+                             address, hash, TYPE_TAGS.get(type, 0), status, value)
+            self.count += 1
+            COUNT.pack_into(self.map, COUNT_OFFSET, self.count)
+
+    def record(self, address, name, type, value, timestamp=None):  # запись прочитанного значения по имени параметра
+        self.append(address, codec.name2hash(name), type, value, STATUS_OK, timestamp)
+
+    def recordError(self, address, name, type, error, timestamp=None):  # запись ошибки чтения параметра
+        status = STATUS_TIMEOUT if isinstance(error, OwenTimeoutError) else STATUS_ERROR
+        self.append(address, codec.name2hash(name), type, None, status, timestamp)
+
+    def flush(self):
+        with self.mutex:
+            self.map.flush()
+
+    def close(self):  # файл обрезается до записанных данных
+        with self.mutex:
+            if self.map is None:
+                return
+            self.map.flush()
+            self.map.close()
+            self.map = None
+            self.file.truncate(HEADER_SIZE + self.count * RECORD.size)
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class OwenRecordReader:  # Чтение файла записей OwenRecorder через mmap
+    """Записи не разбираются из текста: records() распаковывает их struct.iter_unpack,
+    array()/select() при наличии numpy работают с файлом как с массивом без копирования.
+    Пока существуют массивы, полученные из array(), файл нельзя закрыть (close)."""
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, recordSize, reserved, count = HEADER.unpack_from(self.map)
+        if magic != MAGIC or recordSize != RECORD.size:
+            self.close()
+            raise ValueError('{} is not an Owen record file!'.format(path))
+        self.count = min(count, (len(self.map) - HEADER_SIZE) // RECORD.size)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return self.records()
+
+    def records(self, address=None, name=None, start=None, stop=None, hash=None, status=None):
+        """Генератор OwenRecord с фильтрами по адресу, имени (или свертке), интервалу времени [start, stop) и состоянию"""
+        if name is not None:
+            hash = codec.name2hash(name)
+        with memoryview(self.map) as view:
+            for item in RECORD.iter_unpack(view[HEADER_SIZE:HEADER_SIZE + self.count * RECORD.size]):
+                t, itemAddress, itemHash, type, itemStatus, value = item
+                if address is not None and itemAddress != address:
+                    continue
+                if hash is not None and itemHash != hash:
+                    continue
+                if start is not None and t < start:
+                    continue
+                if stop is not None and t >= stop:
+                    continue
+                if status is not None and itemStatus != status:
+                    continue
+                yield OwenRecord(t, itemAddress, itemHash, TYPE_NAMES.get(type), itemStatus, value)
+
+    def array(self):  # все записи как структурированный массив numpy (без копирования, только чтение)
+        if numpy is None:
+            raise ImportError('OwenRecordReader.array requires numpy!')
+        return numpy.frombuffer(self.map, dtype=RECORD_DTYPE, count=self.count, offset=HEADER_SIZE)
+
+    def select(self, address=None, name=None, start=None, stop=None, hash=None, status=None):
+        """Фильтрация записей как в records(), возвращает массив numpy выбранных записей"""
+        records = self.array()
+        mask = numpy.ones(len(records), dtype=bool)
+        if name is not None:
+            hash = codec.name2hash(name)
+        if address is not None:
+            mask &= records['address'] == address
+        if hash is not None:
+            mask &= records['hash'] == hash
+        if start is not None:
+            mask &= records['time'] >= start
+        if stop is not None:
+            mask &= records['time'] < stop
+        if status is not None:
+            mask &= records['status'] == status
+        return records[mask]
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,81 @@
+"""Поиск приборов на шине: перебор адресов коротким запросом с таймаутом, вычисленным по скорости обмена.
+
+Пример:
+    results = scanPorts(['COM3', 'COM4'], baudRate=115200)   # порты опрашиваются параллельно
+    for port, devices in results.items():
+        for device in devices:
+            print(port, device.address, device.addrLen, device.name, device.version)
+"""
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from Owen import OwenDevice, OwenAdaptiveTimeout, OwenError, OwenTimeoutError
+
+OwenScanResult = namedtuple('OwenScanResult', 'port address addrLen name version')
+
+def scanTimeout(baudRate, answerDelay=0.02, margin=0.01):
+    """Таймаут ответа при поиске (с): передача запроса и ответа максимальной длины + задержка ответа прибора + запас"""
+    return OwenAdaptiveTimeout(baudRate).transferTime() + answerDelay + margin
+
+def scanBus(serialPort, addresses=None, addrLen=8, baudRate=None, answerDelay=0.02, retries=0, callback=None):
+    """Перебор адресов на одном порту, возвращает список OwenScanResult ответивших приборов.
+    addresses   -- адреса для перебора, по умолчанию все (0..255 или 0..2047 для 11-битного адреса)
+    baudRate    -- скорость для расчета таймаута, по умолчанию из порта
+    answerDelay -- наибольшая ожидаемая задержка ответа прибора (rSdL), с
+    retries     -- количество повторных запросов адреса при отсутствии ответа
+    callback    -- функция callback(address, result), вызывается после проверки каждого адреса (result или None)
+    Пробный запрос - чтение 'dev'. Ответы принимаются потоковым разборщиком с проверкой адреса и свертки,
+    поэтому опоздавший ответ предыдущего адреса не приписывается следующему."""
+    if addresses is None:
+        addresses = range(256 if addrLen == 8 else 2048)
+    if baudRate is None:
+        baudRate = getattr(serialPort, 'baudrate', 115200)
+    owen = OwenDevice(serialPort, 0, addrLen)
+    owen.useFrameParser()
+    portName = getattr(serialPort, 'port', None) or getattr(serialPort, 'name', None)
+    savedTimeout = serialPort.timeout
+    serialPort.timeout = scanTimeout(baudRate, answerDelay)
+    results = []
+    try:
+        for address in addresses:
+            result = None
+            for attempt in range(retries + 1):
+                try:
+                    name = owen.getDeviceName(address)
+                except OwenTimeoutError:
+                    continue  # нет ответа
+                except OwenError:
+                    name = None  # ответ с ошибкой: прибор на адресе есть
+                result = OwenScanResult(portName, address, detectAddrLen(owen, address, addrLen), name,
+                                        readOptional(owen.getFirmwareVersion, address))
+                results.append(result)
+                break
+            if callback is not None:
+                callback(address, result)
+    finally:
+        serialPort.timeout = savedTimeout
+    return results
+
+def detectAddrLen(owen, address, addrLen):  # длина адреса по параметру A.Len, при ошибке - длина адреса запроса
+    value = readOptional(lambda address: owen.getInt16('A.Len', address), address)
+    return addrLen if value not in (0, 1) else (8, 11)[value]
+
+def readOptional(read, address):  # чтение необязательного параметра, None при ошибке
+    try:
+        return read(address)
+    except OwenError:
+        return None
+
+def scanPorts(ports, baudRate=115200, timeout=1, **kwargs):
+    """Параллельный поиск на нескольких портах (поток на порт), возвращает словарь порт -> список OwenScanResult.
+    ports - имена портов (открываются через pyserial с baudRate) или открытые порты; kwargs передаются в scanBus"""
+    def scan(port):
+        if not isinstance(port, str):
+            return scanBus(port, baudRate=getattr(port, 'baudrate', baudRate), **kwargs)
+        import serial  # pyserial нужен только для открытия портов по имени
+        with serial.Serial(port, baudRate, timeout=timeout) as serialPort:
+            return scanBus(serialPort, baudRate=baudRate, **kwargs)
+    ports = list(ports)
+    if not ports:
+        return {}
+    with ThreadPoolExecutor(max_workers=len(ports)) as executor:
+        return dict(zip(ports, executor.map(scan, ports)))
@@ -0,0 +1,235 @@
+import os
+from threading import Thread, Lock
+from time import monotonic as time, sleep
+from Owen import OwenProtocol, OwenFrameParser, OwenError
+
+class OwenSimulator:  # Программная модель прибора ОВЕН для тестов и оценки производительности без оборудования
+    """Разбирает фреймы запросов, отвечает на чтение и запись параметров из таблицы.
+    Attributes:
+        address       -- сетевой адрес прибора
+        addrLen       -- длина адреса, 8 или 11 бит
+        responseDelay -- задержка ответа (мс), аналог параметра rSdL
+        params        -- таблица параметров: свертка -> [имя, тип, значение]
+        requests      -- количество обработанных запросов
+    """
+    def __init__(self, address, params=None, addrLen=8, responseDelay=0):
+        self.owen = OwenProtocol(None, address, addrLen)  # кодек фреймов
+        self.parser = OwenFrameParser(self.owen)
+        self.address = address
+        self.responseDelay = responseDelay
+        self.params = {}
+        self.requests = 0
+        self.mutex = Lock()
+        for name, (type, value) in (self.defaultParams() if params is None else params).items():
+            self.setParam(name, type, value)
+
+    @property
+    def addrLen(self):
+        return self.owen.addrLen
+
+    @addrLen.setter
+    def addrLen(self, value):
+        self.owen.addrLen = value
+
+    def defaultParams(self):  # набор параметров, достаточный для OwenExample1/OwenExample2
+        return {'dev': ('String', 'TPM201'), 'ver': ('String', 'V1.07'),
+                'bps': ('Int16', 8), 'Len': ('Int16', 1), 'PrtY': ('Int16', 0), 'A.Len': ('Int16', 0 if self.addrLen == 8 else 1),
+                'Addr': ('Int16', self.address), 'sbit': ('Int16', 0), 'n.Err': ('Int16', 0), 'rSdL': ('Int16', self.responseDelay),
+                'PV': ('Float24', 25.0), 'SP': ('Float24', 30.0), 'r-S': ('Char', 0), 'r.oUt': ('IEEE32', 0.0)}
+
+    def setParam(self, name, type, value):  # добавляет или изменяет параметр, список значений - индексированный параметр
+        if not hasattr(self, 'pack' + type):
+            raise OwenError('OwenSimulator: Unknown parameter type {}!'.format(type))
+        self.params[self.owen.name2hash(name)] = [name, type, value]
+
+    def getParam(self, name):
+        return self.params[self.owen.name2hash(name)][2]
+
+    def packString(self, value):
+        return self.owen.packString(value.encode('cp1251'))
+
+    def packFloat24(self, value):
+        return self.owen.packFloat24(value)
+
+    def packIEEE32(self, value):
+        return self.owen.packIEEE32(value)
+
+    def packInt16(self, value):
+        return self.owen.packInt16(value & 0xFFFF)
+
+    def packChar(self, value):
+        return self.owen.packChar(value)
+
+    def unpackString(self, data):
+        return self.owen.unpackString(data).decode('cp1251')
+
+    def unpackFloat24(self, data):
+        return self.owen.unpackFloat24(data)
+
+    def unpackIEEE32(self, data):
+        return self.owen.unpackIEEE32(data)[0]
+
+    def unpackInt16(self, data):
+        return self.owen.unpackInt16(data)
+
+    def unpackChar(self, data):
+        return self.owen.unpackChar(data)
+
+    def handle(self, frame):
+        """Обработка разобранного фрейма OwenFrame, возвращает Raw-фрейм ответа или None (нет ответа)"""
+        if frame.address != self.address:
+            return None
+        param = self.params.get(frame.hash)
+        if param is None:
+            return None  # неизвестный параметр: прибор не отвечает
+        name, type, value = param
+        data = frame.data
+        indexData = b''
+        if isinstance(value, list):  # индексированный параметр: индекс в последних двух байтах данных
+            try:
+                data, index = self.owen.unpackIndex(data)
+            except OwenError:
+                return None
+            if index >= len(value):
+                return None
+            indexData = frame.data[-2:]
+        if not frame.request:  # запись
+            try:
+                newValue = getattr(self, 'unpack' + type)(data)
+            except OwenError:
+                return None
+            if indexData:
+                value[index] = newValue
+            else:
+                param[2] = value = newValue
+        if indexData:
+            value = value[index]
+        with self.mutex:
+            self.requests += 1
+            self.owen.packFrame(frame.hash, self.address, False, getattr(self, 'pack' + type)(value) + indexData)
+            self.owen.packRawFrame()
+            return bytes(self.owen.rawFrame)
+
+    def feed(self, chunk):  # разбор принятых байтов, возвращает список Raw-фреймов ответов
+        responses = []
+        for frame in self.parser.feed(chunk):
+            response = self.handle(frame)
+            if response is not None:
+                responses.append(response)
+        return responses
+
+    def servePty(self):
+        """Запускает обслуживание псевдотерминала (только Linux/Unix), возвращает OwenSimulatorPty,
+        имя устройства для serial.Serial - атрибут name"""
+        pty = OwenSimulatorPty([self])
+        pty.start()
+        return pty
+
+
+class OwenSimulatorPort:  # Порт в памяти с интерфейсом serial.Serial, к которому подключены модели приборов
+    """Поддерживает методы write, read, read_until, reset_input_buffer и свойство in_waiting,
+    поэтому может использоваться в OwenProtocol/OwenDevice вместо serial.Serial."""
+    def __init__(self, devices, timeout=1):
+        self.devices = list(devices) if isinstance(devices, (list, tuple)) else [devices]
+        self.timeout = timeout
+        self.pending = []  # ответы, ожидающие окончания задержки: [время готовности, байты]
+        self.buffer = bytearray()  # принятые байты
+
+    def isOpen(self):
+        return True
+
+    def close(self):
+        pass
+
+    def write(self, data):
+        now = time()
+        for device in self.devices:
+            for response in device.feed(data):
+                self.pending.append([now + device.responseDelay / 1000, response])
+        self.pending.sort(key=lambda item: item[0])
+        return len(data)
+
+    def receive(self):  # перенос ответов с истекшей задержкой во входной буфер, возвращает время готовности следующего
+        now = time()
+        while self.pending and self.pending[0][0] <= now:
+            self.buffer += self.pending.pop(0)[1]
+        return self.pending[0][0] if self.pending else None
+
+    @property
+    def in_waiting(self):
+        self.receive()
+        return len(self.buffer)
+
+    def reset_input_buffer(self):
+        self.receive()
+        self.buffer.clear()
+
+    def readUntil(self, enough):  # ожидание данных до выполнения условия или таймаута, как у serial.Serial
+        deadline = None if self.timeout is None else time() + self.timeout
+        while True:
+            nextTime = self.receive()
+            if enough():
+                return
+            now = time()
+            if deadline is not None and now >= deadline:
+                return
+            wakeTime = deadline if nextTime is None else nextTime if deadline is None else min(nextTime, deadline)
+            if wakeTime is None:
+                return  # без таймаута и без ожидаемых ответов данные не поступят никогда
+            sleep(max(0.0, wakeTime - now))
+
+    def read(self, size=1):
+        self.readUntil(lambda: len(self.buffer) >= size)
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def read_until(self, expected=b'\n', size=None):
+        self.readUntil(lambda: expected in self.buffer or size is not None and len(self.buffer) >= size)
+        pos = self.buffer.find(expected)
+        end = len(self.buffer) if pos < 0 else pos + len(expected)
+        size = end if size is None else min(size, end)
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+
+class OwenSimulatorPty:  # Обслуживание моделей приборов через псевдотерминал (pty)
+    def __init__(self, devices):
+        self.devices = list(devices)
+        self.master = None
+        self.slave = None
+        self.name = None  # имя устройства псевдотерминала
+        self.thread = None
+
+    def start(self):  # возвращает имя устройства псевдотерминала
+        import tty
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+        self.name = os.ttyname(self.slave)
+        return self.name
+
+    def run(self):
+        while True:
+            try:
+                chunk = os.read(self.master, 1024)
+            except OSError:
+                return  # псевдотерминал закрыт
+            if not chunk:
+                return
+            for device in self.devices:
+                for response in device.feed(chunk):
+                    if device.responseDelay:
+                        sleep(device.responseDelay / 1000)
+                    os.write(self.master, response)
+
+    def stop(self):
+        for fd in (self.slave, self.master):
+            if fd is not None:
+                os.close(fd)
+        self.master = self.slave = None
+        if self.thread is not None:
+            self.thread.join(1)
+            self.thread = None
@@ -0,0 +1,256 @@
+"""Пассивный монитор шины: разбор чужого обмена (например, SCADA) без передачи в линию.
+
+Запуск:
+    python OwenSniffer.py --port COM3 --baud 115200 --duration 60 --capture bus.cap   # прослушивание порта с записью
+    python OwenSniffer.py --file bus.cap --baud 115200                                  # разбор записи
+Файл записи содержит куски принятых байтов со временем приема. Файл без заголовка записи разбирается
+как поток байтов без времени: частота запросов, время ответа и загрузка шины оцениваются только при
+заданной длительности (--duration).
+"""
+import argparse
+import struct
+import sys
+from collections import namedtuple
+from time import monotonic as time
+from Owen import OwenProtocol, OwenDevice, OwenFrameParser, OwenLatencyHistogram
+
+CAPTURE_MAGIC = b'OWENCAP1'
+CHUNK_HEADER = struct.Struct('<dH')  # время приема (с от начала записи), длина куска
+
+KNOWN_NAMES = OwenDevice.networkSettingsNames + ('dev', 'ver', 'PV', 'SP', 'r-S', 'r.oUt', 'rEAd', 'SP.LU', 'o', 'inF')
+
+OwenSniffedFrame = namedtuple('OwenSniffedFrame', 'time address addrLen request hash data rawSize')
+
+
+class OwenSnifferParser(OwenFrameParser):  # Разборщик фреймов с определением длины адреса
+    """Фрейм разбирается unpackRawFrame/unpackFrame (проверка CRC и размера данных).
+    Длина адреса: при addrLen=None 11-битный адрес определяется по ненулевым старшим битам второго байта.
+    11-битные адреса, кратные 8, неотличимы от 8-битных, поэтому считаются 11-битными только если
+    в том же блоке из 8 адресов уже встречался однозначно 11-битный адрес."""
+    def __init__(self, owen, addrLen=None):
+        super().__init__(owen)
+        self.addrLen = addrLen  # 8, 11 или None (определение по фреймам)
+        self.blocks11 = set()  # первые байты фреймов, для которых встречались 11-битные адреса
+        self.time = None  # время приема текущего куска
+
+    def decode(self, rawFrame):
+        owen = self.owen
+        owen.unpackRawFrame(rawFrame)
+        hash, data = owen.unpackFrame()
+        frame = owen.frame
+        high = frame[1] >> 5
+        if self.addrLen == 8 or (self.addrLen is None and not high and frame[0] not in self.blocks11):
+            address = frame[0]
+            addrLen = 8
+        else:
+            if high:
+                self.blocks11.add(frame[0])
+            address = frame[0] << 3 | high
+            addrLen = 11
+        return OwenSniffedFrame(self.time, address, addrLen, (frame[1] & 0x10) != 0, hash, data, len(rawFrame))
+
+
+class OwenDeviceTraffic:  # Статистика обмена одного прибора
+    def __init__(self, address, addrLen):
+        self.address = address
+        self.addrLen = addrLen
+        self.requests = 0  # запросы мастера (чтение и запись)
+        self.writes = 0  # запросы записи
+        self.responses = 0  # ответы прибора
+        self.noResponse = 0  # запросы без ответа
+        self.rawBytes = 0  # байты запросов и ответов на линии
+        self.responseTime = OwenLatencyHistogram()  # время от приема запроса до приема ответа (с)
+        self.parameters = {}  # свертка -> количество запросов
+
+
+class OwenSniffer:  # Разбор обмена на шине и статистика по приборам
+    """Запрос и ответ сопоставляются по порядку: ответ - следующий фрейм без признака запроса с тем же адресом
+    и сверткой. Запрос записи, на который прибор не ответил, и следующий такой же запрос записи неотличимы
+    от пары запрос-ответ.
+    Attributes:
+        baudRate    -- скорость обмена (бод)
+        bitsPerChar -- бит на символ (старт + данные + четность + стоп), 10 для 8N1
+        devices     -- (адрес, длина адреса) -> OwenDeviceTraffic
+        frames      -- количество разобранных фреймов
+        bytes       -- количество принятых байтов
+    """
+    def __init__(self, baudRate=115200, addrLen=None, names=(), bitsPerChar=10):
+        self.baudRate = baudRate
+        self.bitsPerChar = bitsPerChar
+        self.owen = OwenProtocol(None, 0)
+        self.owen.preloadNames(KNOWN_NAMES + tuple(names))  # подписи сверток в отчете
+        self.parser = OwenSnifferParser(self.owen, addrLen)
+        self.devices = {}
+        self.pending = None  # запрос, ожидающий ответа
+        self.frames = 0
+        self.bytes = 0
+        self.startTime = None
+        self.lastTime = None
+
+    def feed(self, chunk, timestamp=None):  # разбор куска принятых байтов, timestamp - время приема (с)
+        self.bytes += len(chunk)
+        if timestamp is not None:
+            if self.startTime is None:
+                self.startTime = timestamp
+            self.lastTime = timestamp
+        self.parser.time = timestamp
+        for frame in self.parser.feed(chunk):
+            self.process(frame)
+
+    def device(self, frame):
+        key = (frame.address, frame.addrLen)
+        device = self.devices.get(key)
+        if device is None:
+            device = self.devices[key] = OwenDeviceTraffic(frame.address, frame.addrLen)
+        return device
+
+    def process(self, frame):
+        self.frames += 1
+        pending = self.pending
+        device = self.device(frame)
+        device.rawBytes += frame.rawSize
+        if pending is not None and not frame.request and frame.address == pending.address and frame.hash == pending.hash:
+            device.responses += 1  # ответ на ожидающий запрос
+            if frame.time is not None and pending.time is not None:
+                device.responseTime.add(frame.time - pending.time)
+            self.pending = None
+            return
+        if pending is not None:
+            self.device(pending).noResponse += 1
+        device.requests += 1
+        if not frame.request:
+            device.writes += 1
+        device.parameters[frame.hash] = device.parameters.get(frame.hash, 0) + 1
+        self.pending = frame
+
+    def close(self):  # конец прослушивания: запрос, оставшийся без ответа, учитывается в noResponse
+        if self.pending is not None:
+            self.device(self.pending).noResponse += 1
+            self.pending = None
+
+    def duration(self):  # длительность прослушивания по времени приема (с) или None
+        if self.startTime is None or self.lastTime == self.startTime:
+            return None
+        return self.lastTime - self.startTime
+
+    def report(self, duration=None):
+        """Словарь: длительность, загрузка шины, ошибки разбора и статистика по приборам
+        (частота запросов, время ответа, доля загрузки шины, запросы по параметрам).
+        Ожидающий запрос (до close()) считается оставшимся без ответа"""
+        duration = duration or self.duration()
+        pending = (self.pending.address, self.pending.addrLen) if self.pending is not None else None
+        lineTime = self.bitsPerChar / self.baudRate  # время передачи одного символа (с)
+        devices = []
+        for (address, addrLen), device in sorted(self.devices.items()):
+            devices.append({
+                'address': address, 'addrLen': addrLen, 'requests': device.requests, 'writes': device.writes,
+                'responses': device.responses, 'noResponse': device.noResponse + ((address, addrLen) == pending),
+                'rate': device.requests / duration if duration else None,
+                'responseTime': device.responseTime.summary(),
+                'utilization': device.rawBytes * lineTime / duration if duration else None,
+                'parameters': {self.owen.hash2name(hash, '{:#06x}'.format(hash)): count
+                               for hash, count in sorted(device.parameters.items(), key=lambda item: -item[1])}})
+        return {'duration': duration, 'bytes': self.bytes, 'frames': self.frames,
+                'utilization': self.bytes * lineTime / duration if duration else None,
+                'garbage': self.parser.garbage, 'errors': self.parser.errors, 'devices': devices}
+
+
+def sniffPort(serialPort, sniffer, duration=None, capture=None, stop=None):
+    """Прослушивание порта (только прием) до истечения duration секунд или stop(); capture - OwenCaptureWriter"""
+    startTime = time()
+    while True:
+        chunk = serialPort.read(serialPort.in_waiting or 1)
+        now = time() - startTime
+        if chunk:
+            sniffer.feed(chunk, now)
+            if capture is not None:
+                capture.write(chunk, now)
+        if duration is not None and now >= duration or stop is not None and stop():
+            return sniffer
+
+class OwenCaptureWriter:  # Запись принятых байтов со временем приема для последующего разбора
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+        self.file.write(CAPTURE_MAGIC)
+
+    def write(self, chunk, timestamp):
+        for start in range(0, len(chunk), 0xFFFF):
+            part = chunk[start:start + 0xFFFF]
+            self.file.write(CHUNK_HEADER.pack(timestamp, len(part)))
+            self.file.write(part)
+
+    def close(self):
+        self.file.close()
+
+def readCapture(path, chunkSize=65536):
+    """Генератор (время, байты) из файла записи; для файла без заголовка - (None, байты)"""
+    with open(path, 'rb') as f:
+        if f.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            f.seek(0)
+            while True:
+                chunk = f.read(chunkSize)
+                if not chunk:
+                    return
+                yield None, chunk
+        while True:
+            header = f.read(CHUNK_HEADER.size)
+            if len(header) < CHUNK_HEADER.size:
+                return
+            timestamp, size = CHUNK_HEADER.unpack(header)
+            yield timestamp, f.read(size)
+
+def sniffCapture(path, sniffer):  # разбор файла записи
+    for timestamp, chunk in readCapture(path):
+        sniffer.feed(chunk, timestamp)
+    return sniffer
+
+def printReport(report):
+    def ms(value):
+        return '{:.1f}'.format(value * 1000) if value is not None else '-'
+    def percent(value):
+        return '{:.1f}%'.format(value * 100) if value is not None else '-'
+    duration = report['duration']
+    print('Duration: {} s, bytes: {}, frames: {}, bus utilization: {}, garbage bytes: {}, bad frames: {}'.format(
+        '{:.1f}'.format(duration) if duration else '-', report['bytes'], report['frames'], percent(report['utilization']),
+        report['garbage'], report['errors']))
+    print('{:>7} {:>4} {:>8} {:>7} {:>9} {:>7} {:>8} {:>8} {:>8} {:>7}  parameters'.format(
+        'address', 'bits', 'requests', 'writes', 'responses', 'missed', 'req/s', 'p50 ms', 'p99 ms', 'bus'))
+    for d in report['devices']:
+        print('{:>7} {:>4} {:>8} {:>7} {:>9} {:>7} {:>8} {:>8} {:>8} {:>7}  {}'.format(
+            d['address'], d['addrLen'], d['requests'], d['writes'], d['responses'], d['noResponse'],
+            '{:.1f}'.format(d['rate']) if d['rate'] is not None else '-', ms(d['responseTime']['p50']),
+            ms(d['responseTime']['p99']), percent(d['utilization']),
+            ', '.join('{}:{}'.format(name, count) for name, count in d['parameters'].items())))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Owen bus passive monitor')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--port', help='последовательный порт для прослушивания')
+    source.add_argument('--file', help='файл записи для разбора')
+    parser.add_argument('--baud', type=int, default=115200, help='скорость обмена (бод)')
+    parser.add_argument('--duration', type=float, help='длительность прослушивания или записи без времени (с)')
+    parser.add_argument('--capture', help='файл для записи принятых байтов (при прослушивании порта)')
+    parser.add_argument('--addr-len', type=int, choices=(8, 11), help='длина адреса (по умолчанию определяется по фреймам)')
+    parser.add_argument('--names', nargs='*', default=(), help='дополнительные имена параметров для подписей сверток')
+    args = parser.parse_args(argv)
+
+    sniffer = OwenSniffer(args.baud, args.addr_len, args.names)
+    if args.file:
+        sniffCapture(args.file, sniffer)
+    else:
+        import serial  # pyserial нужен только для прослушивания порта
+        capture = OwenCaptureWriter(args.capture) if args.capture else None
+        try:
+            with serial.Serial(args.port, args.baud, timeout=0.1) as serialPort:
+                sniffPort(serialPort, sniffer, args.duration, capture)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if capture is not None:
+                capture.close()
+    sniffer.close()
+    printReport(sniffer.report(None if sniffer.duration() else args.duration))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
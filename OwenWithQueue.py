@@ -1,5 +1,6 @@
 import struct
 from queue import Queue, Empty, Full
+from collections import OrderedDict
 from time import monotonic as time
 from threading import Lock
 
@@ -359,6 +360,9 @@ class QueueWithPreview(Queue):
     def __init__(self, maxsize=0):
         super().__init__(maxsize)
 
+    def _peek(self):  # первый элемент без извлечения
+        return self.queue[0]
+
     def preview(self, block=True, timeout=None):
         """ from Queue.get() """
         with self.not_empty:
@@ -377,7 +381,7 @@ class QueueWithPreview(Queue):
                     if remaining <= 0.0:
                         raise Empty
                     self.not_empty.wait(remaining)
-            item = self.queue[0]
+            item = self._peek()
             # self.not_full.notify()
             return item
 
@@ -390,11 +394,258 @@ class QueueWithPreview(Queue):
 
 # Queue.preview = preview
 
+class CoalescingQueue(QueueWithPreview):
+    """Командная очередь с объединением команд по ключу (адрес, параметр): новая команда записи заменяет
+    еще не выполненную команду того же параметра, на шину уходит только последнее значение (например, уставка
+    при перемещении ползунка). Команды выполняются в порядке первой постановки ключа в очередь.
+    Команда - кортеж (параметр, значение) или (параметр, значение, адрес).
+    Порядок работы: item = preview(), запись на прибор, commit(item) только после удачной записи.
+    Attributes:
+        address -- адрес прибора для команд без адреса
+    """
+    def __init__(self, maxsize=0, address=None):
+        super().__init__(maxsize)
+        self.address = address
+
+    def _init(self, maxsize):
+        self.queue = OrderedDict()  # (адрес, параметр) -> команда
+
+    def _qsize(self):
+        return len(self.queue)
+
+    def _put(self, item):
+        self.queue[self.key(item)] = item  # замена значения сохраняет место ключа в очереди
+
+    def _get(self):
+        return self.queue.popitem(last=False)[1]
+
+    def _peek(self):
+        return next(iter(self.queue.values()))
+
+    def key(self, item):  # ключ объединения команд
+        return (item[2] if len(item) > 2 and item[2] is not None else self.address), item[0]
+
+    def put(self, item, block=True, timeout=None):
+        with self.mutex:
+            key = self.key(item)
+            if key in self.queue:  # замена ожидающей команды не занимает места в очереди
+                self.queue[key] = item
+                self.not_empty.notify()
+                return
+        super().put(item, block, timeout)
+
+    def commit(self, item):
+        """Удаляет выполненную команду. Если за время записи команда была заменена более новой,
+        новая остается в очереди и возвращается False"""
+        with self.mutex:
+            return self._commit(item)
+
+    def _commit(self, item):  # commit при захваченном мьютексе очереди
+        key = self.key(item)
+        if self.queue.get(key) is not item:
+            return False
+        del self.queue[key]
+        self.not_full.notify()
+        return True
+
+    def putCmd(self, *args):
+        self.put(args)
+
+PRIORITY_WRITE = 0  # команды записи оператора
+PRIORITY_ALARM = 1  # чтение аварийно-важных параметров
+PRIORITY_BACKGROUND = 2  # фоновое чтение
+
+class OwenReadTask:  # Периодическое чтение параметра: приоритет, срок выполнения, последнее значение
+    def __init__(self, address, name, type, period, priority, deadline, callback):
+        self.address = address
+        self.name = name
+        self.type = type  # тип данных, по имени метода распаковки: 'Float24' -> unpackFloat24
+        self.period = period  # период чтения (с), 0 - так часто, как возможно
+        self.priority = priority  # PRIORITY_ALARM, PRIORITY_BACKGROUND или любое число (меньше - важнее)
+        self.deadline = deadline  # допустимая задержка чтения после наступления его времени (с), None - без срока
+        self.callback = callback  # функция callback(task), вызывается в потоке шины после удачного чтения
+        self.nextTime = 0.0  # время следующего чтения
+        self.deadlineTime = None  # срок текущего чтения
+        self.value = None  # последнее прочитанное значение
+        self.timestamp = None  # время получения последнего значения
+        self.error = None  # последняя ошибка (None при удачном чтении)
+        self.count = 0  # количество удачных чтений
+        self.errors = 0  # количество ошибок
+        self.missed = 0  # количество чтений, выполненных позже срока
+
+    def schedule(self, nextTime):
+        self.nextTime = nextTime
+        self.deadlineTime = None if self.deadline is None else nextTime + self.deadline
+
+
+class OwenScheduler:  # Планировщик обмена с приоритетами и сроками для записи и чтения на одной шине
+    """Заменяет предпросмотр очереди с ожиданием в каждом цикле опроса: следующая транзакция выбирается сразу
+    после предыдущей (runOnce), без блокирующего ожидания очереди команд.
+    Порядок выбора:
+        1. команды записи (объединяются по (адрес, параметр), удаляются из очереди только после удачной записи;
+           после неудачной записи повтор откладывается на retryInterval, удваиваемый до maxRetryInterval,
+           чтобы неудачная команда не вытесняла чтение);
+        2. готовые к чтению параметры с истекшим сроком (deadline);
+        3. остальные готовые к чтению параметры по приоритету, внутри приоритета - по сроку или времени чтения.
+    Ожидание (wait) нужно только когда выполнять нечего, и прерывается новой командой записи.
+    Attributes:
+        owen     -- экземпляр OwenProtocol/OwenDevice, через который выполняется обмен
+        commands -- очередь команд записи (CoalescingQueue)
+        tasks    -- список OwenReadTask
+        expired  -- количество команд записи, отброшенных по истечении срока
+        retryInterval    -- задержка повтора записи после первой неудачи (с)
+        maxRetryInterval -- наибольшая задержка повтора записи (с)
+    """
+    def __init__(self, owen, retryInterval=0.5, maxRetryInterval=10.0):
+        self.owen = owen
+        self.commands = CoalescingQueue(address=owen.address)
+        self.tasks = []
+        self.writeTypes = {}  # (адрес, имя) -> тип данных для записи
+        self.expired = 0
+        self.retryInterval = retryInterval
+        self.maxRetryInterval = maxRetryInterval
+        self.retries = {}  # (адрес, имя) -> (количество неудачных записей подряд, время следующей попытки), под commands.mutex
+
+    def addRead(self, name, type, period=0, priority=PRIORITY_BACKGROUND, deadline=None, address=None, callback=None):
+        """Добавляет периодическое чтение параметра, возвращает OwenReadTask"""
+        if not hasattr(self.owen, 'unpack' + type):
+            raise OwenError('OwenScheduler: Unknown parameter type {}!'.format(type))
+        if address is None:
+            address = self.owen.address
+        self.owen.name2hash(name)  # проверка имени
+        task = OwenReadTask(address, name, type, period, priority, deadline, callback)
+        task.schedule(time())
+        self.tasks.append(task)
+        self.writeTypes.setdefault((address, name), type)
+        return task
+
+    def putWrite(self, name, value, type=None, address=None, deadline=None, callback=None):
+        """Ставит команду записи в очередь (заменяет еще не выполненную запись того же параметра).
+        type     -- тип данных, по умолчанию тип чтения этого параметра (addRead)
+        deadline -- команда отбрасывается, если не выполнена за deadline секунд
+        callback -- функция callback(name, value), вызывается в потоке шины после удачной записи"""
+        if address is None:
+            address = self.owen.address
+        if type is None:
+            type = self.writeTypes.get((address, name))
+            if type is None:
+                raise OwenError('OwenScheduler: Unknown type of parameter {} for writing!'.format(name))
+        deadlineTime = None if deadline is None else time() + deadline
+        self.commands.put((name, value, address, type, deadlineTime, callback))
+        with self.commands.mutex:  # новое значение записывается без ожидания повтора
+            self.retries.pop((address, name), None)
+
+    def putCmd(self, name, value, address=None):  # совместимость с QueueWithPreview.putCmd
+        self.putWrite(name, value, address=address)
+
+    def nextTask(self, now):  # готовое к выполнению чтение с наименьшим ключом (приоритет, срок) или None
+        best = None
+        bestKey = None
+        for task in self.tasks:
+            if task.nextTime > now:
+                continue
+            if task.deadlineTime is not None and task.deadlineTime <= now:
+                key = (PRIORITY_WRITE, task.deadlineTime)  # срок истек: выполняется раньше остальных чтений
+            else:
+                key = (task.priority, task.nextTime if task.deadlineTime is None else task.deadlineTime)
+            if bestKey is None or key < bestKey:
+                best = task
+                bestKey = key
+        return best
+
+    def nextWrite(self, items, now):  # первая команда записи, для которой наступило время попытки, или None (под commands.mutex)
+        for item in items:
+            retry = self.retries.get(self.commands.key(item))
+            if retry is None or retry[1] <= now:
+                return item
+        return None
+
+    def nextDelay(self, items=None):
+        """Время до следующей транзакции (с): 0 - есть готовая команда или чтение, None - задач нет.
+        items - команды записи очереди при захваченном commands.mutex (по умолчанию мьютекс захватывается здесь)"""
+        if items is None:
+            with self.commands.mutex:
+                return self.nextDelay(self.commands.queue.values())
+        now = time()
+        times = [task.nextTime for task in self.tasks]
+        for item in items:
+            retry = self.retries.get(self.commands.key(item))
+            if retry is None:
+                return 0.0
+            times.append(retry[1])
+        if not times:
+            return None
+        return max(0.0, min(times) - now)
+
+    def runOnce(self):
+        """Выполняет одну транзакцию без ожидания, возвращает выполненную команду записи (кортеж),
+        OwenReadTask или None, если выполнять нечего. Ошибки обмена сохраняются в задаче и передаются дальше"""
+        now = time()
+        with self.commands.mutex:
+            item = self.nextWrite(self.commands.queue.values(), now)
+        if item is not None:
+            return self.write(item, now)
+        task = self.nextTask(now)
+        if task is not None:
+            self.read(task, now)
+        return task
+
+    def write(self, item, now):
+        name, value, address, type, deadlineTime, callback = item
+        key = (address, name)
+        if deadlineTime is not None and now > deadlineTime:
+            self.commitWrite(item, key)  # устаревшая команда не отправляется
+            self.expired += 1
+            return item
+        try:
+            data = self.owen.getPingPong(address, name, False, getattr(self.owen, 'pack' + type)(value))
+        except Exception:
+            with self.commands.mutex:
+                if self.commands.queue.get(key) is item:  # команда не заменена новым значением: повтор позже
+                    failures = self.retries.get(key, (0, 0.0))[0] + 1
+                    self.retries[key] = (failures, now + min(self.retryInterval * 2 ** (failures - 1), self.maxRetryInterval))
+            raise
+        self.commitWrite(item, key)  # извлечение команды из очереди только после удачной записи!
+        if callback is not None:
+            callback(name, getattr(self.owen, 'unpack' + type)(data))
+        return item
+
+    def commitWrite(self, item, key):  # удаление команды и ее состояния повторов, если команда не заменена новой
+        with self.commands.mutex:
+            if self.commands._commit(item):
+                self.retries.pop(key, None)
+
+    def read(self, task, now):
+        deadlineTime = task.deadlineTime
+        task.schedule(max(task.nextTime + task.period, now))  # при отставании не догоняем пропущенные чтения
+        try:
+            value = getattr(self.owen, 'unpack' + task.type)(self.owen.getPingPong(task.address, task.name))
+        except Exception as e:
+            task.error = e
+            task.errors += 1
+            raise
+        task.value = value
+        task.timestamp = time()
+        task.error = None
+        task.count += 1
+        if deadlineTime is not None and task.timestamp > deadlineTime:
+            task.missed += 1
+        if task.callback is not None:
+            task.callback(task)
+
+    def wait(self, timeout=None):  # ожидание следующей транзакции, прерывается новой командой записи
+        with self.commands.not_empty:  # расчет под мьютексом очереди: новая команда не будет пропущена
+            delay = self.nextDelay(self.commands.queue.values())
+            if timeout is not None:
+                delay = timeout if delay is None else min(delay, timeout)
+            if delay is None or delay > 0:
+                self.commands.not_empty.wait(delay)
+
 class OwenDevice(OwenProtocol):
     def __init__(self, serialPort, address, addrLen=8):
         super().__init__(serialPort, address, addrLen)
-        self.queueCmd = QueueWithPreview(1)  # очередь из одного элемента
-        # self.queueCmd = QueueWithPreview(10)
+        self.queueCmd = OwenScheduler(self)  # планировщик команд записи и чтения (putCmd, addRead, runOnce)
+        # self.queueCmd = QueueWithPreview(1)  # очередь из одного элемента
 
     def getDeviceName(self, address=None):  # возвращает имя устройства
         return self.getString('dev', address).decode('cp1251')
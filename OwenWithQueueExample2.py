@@ -28,26 +28,8 @@ def OwenIODaemon():
                 queueLogMsg.put('Прошивка: {}'.format(owenDev.getFirmwareVersion()))
                 queueLogMsg.put(owenDev.getNetworkSettings())
 
-            rs = owenDev.getChar('r-S')
-            pidOnOffButtonState(rs)
-            pv = owenDev.getFloat24('PV')
-            sp = owenDev.getFloat24('SP')
-            if not spScale.lock:
-                spScale.set(sp)
-            queueLogMsg.put('SP = {:.2f} °C, PV = {:.2f} °C, PID = {}, lock = {}'.format(sp, pv, rs, spScale.lock))
-
-            cmd, val = owenDev.queueCmd.preview(timeout=1)  # предпросмотр команды из очереди
-            if cmd == 'r-S':
-                rs = owenDev.writeChar('r-S', val)
-                owenDev.queueCmd.get(timeout=0) # извлечение команды из очереди только после удачной записи!
-                queueLogMsg.put('Команда запуска PID. PID = {}'.format(rs)) if rs else queueLogMsg.put('Команда остановки PID. PID = {}'.format(rs))
-            elif cmd == 'SP':
-                sp = owenDev.writeFloat24('SP', val)
-                owenDev.queueCmd.get(timeout=0)  # извлечение команды из очереди только после удачной записи!
-                queueLogMsg.put('Изменение уставки SP = {:.2f} °C'.format(sp))
-        except Empty:
-            # queueLogMsg.put("timeout очереди")
-            pass
+            if owenDev.queueCmd.runOnce() is None:  # следующая транзакция выбирается сразу, по приоритету и сроку
+                owenDev.queueCmd.wait(0.1)  # выполнять нечего: ожидание чтения по расписанию или новой команды
         except Exception as e:
             owenDevError = True
             queueLogMsg.put(e)
@@ -57,6 +39,31 @@ def OwenIODaemon():
 
     print("OwenIO daemon остановлен")
 
+def onReadRS(task):  # вызывается в потоке OwenIODaemon после чтения
+    global rs
+    rs = task.value
+    pidOnOffButtonState(rs)
+
+def onReadSP(task):
+    global sp
+    sp = task.value
+    if not spScale.lock:
+        spScale.set(sp)
+
+def onReadPV(task):
+    global pv
+    pv = task.value
+    queueLogMsg.put('SP = {:.2f} °C, PV = {:.2f} °C, PID = {}, lock = {}'.format(sp, pv, rs, spScale.lock))
+
+def onWrite(name, value):  # вызывается в потоке OwenIODaemon после удачной записи
+    global rs, sp
+    if name == 'r-S':
+        rs = value
+        queueLogMsg.put('Команда запуска PID. PID = {}'.format(rs)) if rs else queueLogMsg.put('Команда остановки PID. PID = {}'.format(rs))
+    elif name == 'SP':
+        sp = value
+        queueLogMsg.put('Изменение уставки SP = {:.2f} °C'.format(sp))
+
 def writeToLog(msg):
     # https://tkdocs.com/tutorial/text.html#basics
     numlines = int(log.index('end - 1 line').split('.')[0])
@@ -97,6 +104,9 @@ builtins.queueLogMsg = Queue()  # создаем глобальную очере
 
 com = serial.Serial()  # создаем объект порта
 owenDev = OwenWithQueue.OwenDevice(com, 1)  # порт, адрес устройства
+owenDev.queueCmd.addRead('PV', 'Float24', period=1, priority=OwenWithQueue.PRIORITY_ALARM, deadline=0.5, callback=onReadPV)
+owenDev.queueCmd.addRead('SP', 'Float24', period=1, callback=onReadSP)
+owenDev.queueCmd.addRead('r-S', 'Char', period=1, callback=onReadRS)
 owenDevError = False
 sp = 0  # Уставка
 rs = False  # Вкл./выкл. PID
@@ -122,7 +132,7 @@ defaultColor = topFrame.cget('bg')
 Label(topFrame, text="Вкл./выкл. PID").grid(row=0, column=0)
 Label(topFrame, text="Уставка SP").grid(row=0, column=1)
 
-pidOnOffButton = Button(topFrame, text="?", width=15, height=2, command=lambda: owenDev.queueCmd.putCmd('r-S', not rs))
+pidOnOffButton = Button(topFrame, text="?", width=15, height=2, command=lambda: owenDev.queueCmd.putWrite('r-S', not rs, callback=onWrite))
 pidOnOffButton.grid(row=1, column=0, padx=2)
 
 def pidOnOffButtonState(state):
@@ -131,7 +141,7 @@ def pidOnOffButtonState(state):
 spScale = Scale(topFrame, from_=0, to=100, tickinterval=50, orient=HORIZONTAL)
 spScale.lock = False  # добавляем новый атрибут "блокировка" (запрет изменения значения из OwenIODaemon)
 spScale.bind("<Button-1>", lambda e: setattr(e.widget, 'lock', True))  # блокируем Wiget на изменение значения из OwenIODaemon
-spScale.bind("<ButtonRelease-1>", lambda e: (owenDev.queueCmd.putCmd('SP', e.widget.get()), setattr(e.widget, 'lock', False)))
+spScale.bind("<ButtonRelease-1>", lambda e: (owenDev.queueCmd.putWrite('SP', e.widget.get(), callback=onWrite), setattr(e.widget, 'lock', False)))
 
 # spScale.bind("<Button-1>", lambda event: globals().update(spScaleLock=True))
 # spScale.bind("<ButtonRelease-1>", lambda event: [owenDev.queueCmd.putCmd('SP', spScale.get()), globals().update(spScaleLock=False)])